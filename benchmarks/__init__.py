@@ -0,0 +1 @@
+"""Producer benchmarks against in-process AWS fakes."""
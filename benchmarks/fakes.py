@@ -0,0 +1,396 @@
+"""
+
+## Fakes
+In-process stand-ins for the CloudWatch, Kinesis and Glue clients the
+Lambdas use, with configurable per-call latency and throttling, plus
+synthetic definitions to drive them. Nothing here talks to AWS.
+
+"""
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import (
+    Dict,
+    List
+)
+
+from botocore.exceptions import ClientError
+
+from dataquality.metric import (
+    Metric,
+    Dimension,
+    Metadata,
+    Widget
+)
+from dataquality.set import (
+    MetricSet,
+    SLASet
+)
+from dataquality.sla import SLA
+from definitions import definition as definition_module
+
+ACCOUNT = '123412341234'
+REGION = 'us-east-1'
+
+def throttling_error(operation: str) -> ClientError:
+    """Build the ClientError a throttled AWS call raises."""
+    return ClientError(
+        {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}},
+        operation
+    )
+
+class FakeClient():
+    """
+    Base for fake clients: sleeps latency seconds per call and raises a
+    throttling error with probability throttle_rate
+    """
+    latency: float
+    throttle_rate: float
+
+    def __init__(self, latency: float = 0.0, throttle_rate: float = 0.0, seed: int = 0) -> None:
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.calls: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self, operation: str) -> None:
+        """Count, delay and maybe throttle one call."""
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            throttled = self._random.random() < self.throttle_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            raise throttling_error(operation)
+
+    def chance(self, rate: float) -> bool:
+        """Thread-safe draw from the client's random source."""
+        with self._lock:
+            return self._random.random() < rate
+
+class FakePaginator():
+    """
+    Follow NextToken through a fake client operation
+    """
+
+    def __init__(self, operation, result_key: str) -> None:
+        self.operation = operation
+        self.result_key = result_key
+
+    def paginate(self, **kwargs):
+        """Yield every page of the operation."""
+        while True:
+            page = self.operation(**kwargs)
+            yield page
+            if not page.get('NextToken'):
+                return
+            kwargs['NextToken'] = page['NextToken']
+
+class FakeCloudWatch(FakeClient):
+    """
+    get_metric_data, describe_alarms and describe_alarm_history over
+    synthetic series, alarms and history
+    """
+    max_datapoints: int
+    alarms: List[dict]
+    history: List[dict]
+
+    def __init__(self, alarms: List[dict] = None, history: List[dict] = None, max_datapoints: int = 100800, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.alarms = alarms or []
+        self.history = sorted(history or [], key=lambda item: item['Timestamp'])
+        self.max_datapoints = max_datapoints
+        self._matching = {}
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, NextToken=None, **_kwargs) -> dict:
+        """Return one series per query with a datapoint every Period, paged by max_datapoints."""
+        self.call('GetMetricData')
+        seconds = (EndTime - StartTime).total_seconds()
+        offset = int(NextToken or 0)
+        budget = self.max_datapoints
+        results = []
+        for position in range(offset, len(MetricDataQueries)):
+            query = MetricDataQueries[position]
+            period = query['MetricStat']['Period'] if 'MetricStat' in query else query['Period']
+            count = max(1, int(seconds // period))
+            if results and count > budget:
+                return {'MetricDataResults': results, 'NextToken': str(position)}
+            budget -= count
+            results.append({
+                'Id': query['Id'],
+                'Label': query.get('Label', query['Id']),
+                'Timestamps': [EndTime - timedelta(seconds=period * (step + 1)) for step in range(count)],
+                'Values': [float(step) for step in range(count)],
+                'StatusCode': 'Complete'
+            })
+        return {'MetricDataResults': results}
+
+    def describe_alarms(self, AlarmNamePrefix='', NextToken=None, MaxRecords=100, **_kwargs) -> dict:
+        """Return the alarms matching AlarmNamePrefix, MaxRecords per page."""
+        self.call('DescribeAlarms')
+        if AlarmNamePrefix not in self._matching:
+            self._matching[AlarmNamePrefix] = [
+                alarm for alarm in self.alarms if alarm['AlarmName'].startswith(AlarmNamePrefix)
+            ]
+        matching = self._matching[AlarmNamePrefix]
+        offset = int(NextToken or 0)
+        page = {'MetricAlarms': [dict(alarm) for alarm in matching[offset:offset + MaxRecords]]}
+        if offset + MaxRecords < len(matching):
+            page['NextToken'] = str(offset + MaxRecords)
+        return page
+
+    def describe_alarm_history(self, StartDate, EndDate, NextToken=None, MaxRecords=100, **_kwargs) -> dict:
+        """Return the history items between StartDate and EndDate inclusive, oldest first."""
+        self.call('DescribeAlarmHistory')
+        matching = [item for item in self.history if StartDate <= item['Timestamp'] <= EndDate]
+        offset = int(NextToken or 0)
+        page = {'AlarmHistoryItems': matching[offset:offset + MaxRecords]}
+        if offset + MaxRecords < len(matching):
+            page['NextToken'] = str(offset + MaxRecords)
+        return page
+
+    def get_paginator(self, operation: str) -> FakePaginator:
+        """Paginator over describe_alarms, describe_alarm_history or get_metric_data."""
+        if operation == 'describe_alarms':
+            return FakePaginator(self.describe_alarms, 'MetricAlarms')
+        if operation == 'describe_alarm_history':
+            return FakePaginator(self.describe_alarm_history, 'AlarmHistoryItems')
+        return FakePaginator(self.get_metric_data, 'MetricDataResults')
+
+class FakeKinesis(FakeClient):
+    """
+    put_records failing individual entries with probability record_failure_rate
+    """
+    record_failure_rate: float
+
+    def __init__(self, record_failure_rate: float = 0.0, shard_count: int = 4, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.record_failure_rate = record_failure_rate
+        self.shard_count = shard_count
+        self.records = 0
+        self.bytes = 0
+
+    def describe_stream_summary(self, StreamName) -> dict:
+        """Return the stream's open shard count."""
+        self.call('DescribeStreamSummary')
+        return {'StreamDescriptionSummary': {'StreamName': StreamName, 'OpenShardCount': self.shard_count}}
+
+    def put_records(self, Records, StreamName) -> dict:
+        """Accept a batch, failing entries as throttled per record_failure_rate."""
+        self.call('PutRecords')
+        results = []
+        failed = 0
+        for record in Records:
+            if self.chance(self.record_failure_rate):
+                failed += 1
+                results.append({
+                    'ErrorCode': 'ProvisionedThroughputExceededException',
+                    'ErrorMessage': 'Rate exceeded for shard'
+                })
+                continue
+            data = record['Data']
+            with self._lock:
+                self.records += 1
+                self.bytes += len(data.encode('utf-8') if isinstance(data, str) else data)
+            results.append({'SequenceNumber': '0', 'ShardId': 'shardId-000000000000'})
+        return {'FailedRecordCount': failed, 'Records': results}
+
+class FakeSNS(FakeClient):
+    """
+    publish_batch failing individual entries with probability entry_failure_rate
+    """
+    entry_failure_rate: float
+
+    def __init__(self, entry_failure_rate: float = 0.0, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.entry_failure_rate = entry_failure_rate
+        self.messages: Dict[str, List[str]] = {}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries) -> dict:
+        """Accept a batch, failing entries as throttled per entry_failure_rate."""
+        self.call('PublishBatch')
+        successful = []
+        failed = []
+        for entry in PublishBatchRequestEntries:
+            if self.chance(self.entry_failure_rate):
+                failed.append({'Id': entry['Id'], 'Code': 'Throttling', 'SenderFault': False})
+                continue
+            with self._lock:
+                self.messages.setdefault(TopicArn, []).append(entry['Message'])
+            successful.append({'Id': entry['Id'], 'MessageId': entry['Id']})
+        return {'Successful': successful, 'Failed': failed}
+
+class FakeGlue(FakeClient):
+    """
+    get_table, get_partitions, create_partition and batch_create_partition
+    over an in-memory catalog
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.partitions: Dict[tuple, List[dict]] = {}
+
+    def get_table(self, DatabaseName, Name, **_kwargs) -> dict:
+        self.call('GetTable')
+        return {'Table': {
+            'Name': Name,
+            'DatabaseName': DatabaseName,
+            'VersionId': '1',
+            'StorageDescriptor': {
+                'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+                'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+                'Location': f's3://bucket/{Name}/',
+                'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'}
+            }
+        }}
+
+    def get_partitions(self, CatalogId, DatabaseName, TableName, Expression=None, **_kwargs) -> dict:
+        self.call('GetPartitions')
+        partitions = self.partitions.get((CatalogId, DatabaseName, TableName), [])
+        if Expression:
+            partitions = [
+                partition for partition in partitions
+                if partition['Expression'] == Expression
+            ]
+        return {'Partitions': partitions}
+
+    def create_partition(self, CatalogId, DatabaseName, TableName, PartitionInput, **_kwargs) -> dict:
+        self.call('CreatePartition')
+        region, year, month, day, hour = PartitionInput['Values']
+        with self._lock:
+            self.partitions.setdefault((CatalogId, DatabaseName, TableName), []).append({
+                'Values': PartitionInput['Values'],
+                'Expression': f"region='{region}' and year={year} and month={month} and day={day} and hour={hour}"
+            })
+        return {}
+
+    def batch_create_partition(self, CatalogId, DatabaseName, TableName, PartitionInputList, **_kwargs) -> dict:
+        self.call('BatchCreatePartition')
+        errors = []
+        with self._lock:
+            partitions = self.partitions.setdefault((CatalogId, DatabaseName, TableName), [])
+            existing = {tuple(partition['Values']) for partition in partitions}
+            for partition_input in PartitionInputList:
+                values = partition_input['Values']
+                if tuple(values) in existing:
+                    errors.append({
+                        'PartitionValues': values,
+                        'ErrorDetail': {'ErrorCode': 'AlreadyExistsException', 'ErrorMessage': 'Partition already exists.'}
+                    })
+                    continue
+                region, year, month, day, hour = values
+                partitions.append({
+                    'Values': values,
+                    'Expression': f"region='{region}' and year={year} and month={month} and day={day} and hour={hour}"
+                })
+                existing.add(tuple(values))
+        return {'Errors': errors}
+
+class FakeContext():
+    """
+    Lambda context for a fake invocation
+    """
+    invoked_function_arn: str
+    function_name: str
+
+    def __init__(self, account: str = ACCOUNT, region: str = REGION, timeout_ms: float = 900000) -> None:
+        self.function_name = 'data-gov-metrics-streamer-fake'
+        self.invoked_function_arn = f'arn:aws:lambda:{region}:{account}:function:{self.function_name}'
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self) -> float:
+        return (self._deadline - time.monotonic()) * 1000
+
+def synthetic_definition(metric_count: int, frequency: str = Metric.MINUTE, account: str = ACCOUNT):
+    """
+    Build metric_count metrics, each with an SLA, and install them as the
+    account's cached Definition.
+    """
+    dashboard = Widget(dashboard_name='benchmark')
+    metric_set = MetricSet('benchmark')
+    sla_set = SLASet()
+    for position in range(metric_count):
+        metric = Metric(
+            metric_set=metric_set,
+            namespace='Benchmark/Synthetic',
+            name=f'Metric{position % 100}',
+            frequency=frequency,
+            statistic='Sum',
+            dashboard=dashboard,
+            metadata=[Metadata(name='Dataset', value=f'dataset-{position % 10}')],
+            dimensions=[Dimension(name='FunctionName', value=f'function-{position}')]
+        )
+        SLA(
+            sla_set=sla_set,
+            metric=metric,
+            threshold=1,
+            comparison_operator='LESS_THAN_OR_EQUAL_TO_THRESHOLD',
+            short_description='benchmark',
+            details='benchmark',
+            sns_enabled=True
+        )
+
+    definition = definition_module.Definition.__new__(definition_module.Definition)
+    definition.metric_sets = [metric_set]
+    definition.sla_sets = [sla_set]
+    definition.account_definitions = []
+    definition._metric_stream = None
+    definition._metric_index = None
+    definition._sla_index = {}
+    definition._alarm_index = {}
+    definition.content_fingerprint = None
+    definition_module._DEFINITION_CACHE[account] = (None, definition)
+    return definition
+
+def synthetic_alarms(definition, region: str = REGION) -> List[dict]:
+    """Describe an alarm per SLA, named the way the SLA alarm construct names them."""
+    alarms = []
+    for sla_set in definition.sla_sets:
+        for sla in sla_set.slas:
+            metric = sla.metric
+            alarms.append({
+                'AlarmName': sla.alarm_name(region),
+                'StateValue': 'OK',
+                'Namespace': metric.namespace,
+                'MetricName': metric.name,
+                'Period': metric.period,
+                'Statistic': metric.statistic,
+                'Threshold': float(sla.threshold),
+                'ComparisonOperator': 'LessThanOrEqualToThreshold',
+                'Dimensions': [dimension.api_structure() for dimension in metric.dimensions or []]
+            })
+    return alarms
+
+def synthetic_notifications(alarms: List[dict], region: str = REGION) -> dict:
+    """An SNS event with an ALARM notification record per alarm."""
+    return {'Records': [{
+        'EventSubscriptionArn': f'arn:aws:sns:{region}:{ACCOUNT}:data-gov-sla:subscription',
+        'Sns': {
+            'Subject': f'ALARM: "{alarm["AlarmName"]}" in {region}',
+            'Timestamp': '2026-01-01T00:00:00.000Z',
+            'Message': json.dumps({
+                'AlarmName': alarm['AlarmName'],
+                'NewStateValue': 'ALARM',
+                'StateChangeTime': '2026-01-01T00:00:00.000+0000'
+            })
+        }
+    } for alarm in alarms]}
+
+def synthetic_alarm_history(alarms: List[dict], start: datetime, end: datetime) -> List[dict]:
+    """One OK to ALARM StateUpdate per alarm, spread evenly over [start, end)."""
+    step = (end - start) / max(1, len(alarms))
+    return [{
+        'AlarmName': alarm['AlarmName'],
+        'AlarmType': 'MetricAlarm',
+        'Timestamp': start + step * position,
+        'HistoryItemType': 'StateUpdate',
+        'HistorySummary': 'Alarm updated from OK to ALARM',
+        'HistoryData': json.dumps({
+            'version': '1.0',
+            'oldState': {'stateValue': 'OK', 'stateReason': 'Threshold Crossed'},
+            'newState': {'stateValue': 'ALARM', 'stateReason': 'Threshold Crossed'}
+        })
+    } for position, alarm in enumerate(alarms)]
@@ -0,0 +1,63 @@
+"""
+
+## Partition Key Distribution
+Check that the series partition keys of a synthetic definition spread
+evenly across N evenly split Kinesis shards.
+
+    python -m benchmarks.partitioning --keys 20000 --shards 2 4 16
+
+Exits non-zero when any shard deviates from an even split by more than
+--max-deviation, so a skewed strategy fails the run.
+
+"""
+import sys
+import json
+import argparse
+import importlib
+
+from benchmarks.fakes import synthetic_definition
+
+partitioning = importlib.import_module('lambda.partitioning')
+
+DEFAULT_SHARDS = (2, 4, 16)
+
+def check_distribution(keys: list, shard_count: int) -> dict:
+    """Report each shard's share of keys and the worst deviation from an even split."""
+    distribution = partitioning.shard_distribution(keys, shard_count)
+    expected = len(keys) / shard_count
+    return {
+        'Shards': shard_count,
+        'Keys': len(keys),
+        'MaxDeviation': round(max(abs(count - expected) for count in distribution.values()) / expected, 4),
+        'Distribution': distribution
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--keys', type=int, default=20000, help='synthetic metrics to key')
+    parser.add_argument('--shards', type=int, nargs='+', default=DEFAULT_SHARDS)
+    parser.add_argument('--strategy', choices=partitioning.STRATEGIES, default=partitioning.SERIES)
+    parser.add_argument('--max-deviation', type=float, default=0.1, help='fail above this fraction off an even split')
+    args = parser.parse_args(argv)
+
+    definition = synthetic_definition(args.keys)
+    keys = [
+        partitioning.partition_key(
+            series_id=metric.unique_id(),
+            namespace=metric.namespace,
+            account='123412341234',
+            strategy=args.strategy
+        )
+        for metric in definition.metric_stream.metrics
+    ]
+
+    failed = False
+    for shard_count in args.shards:
+        report = check_distribution(keys, shard_count)
+        print(json.dumps(report))
+        if report['MaxDeviation'] > args.max_deviation:
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+
+## Producer Benchmarks
+End-to-end throughput and per-stage timings of metric_stream_producer,
+its result translation against the former nested metric scan, the
+aggregated record encoding against JSON, sla_stream_producer, its alarm history mode, sla_parse and add_partition
+against the in-process fakes.
+
+    python -m benchmarks.producers --sizes 1000 10000 100000
+    python -m benchmarks.producers --benchmarks metric --latency 0.02 --min-throughput 5000
+
+Exits non-zero when any run falls below --min-throughput items per second,
+so a regression fails the run.
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib
+from datetime import datetime, timedelta, timezone
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+STATE_DIR = tempfile.mkdtemp(prefix='producer-benchmarks-')
+
+# The Lambda modules read their configuration at import
+for name, value in {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'KINESIS_MINUTE_STREAM_NAME': 'benchmark-minute',
+    'KINESIS_HOUR_STREAM_NAME': 'benchmark-hour',
+    'KINESIS_DAY_STREAM_NAME': 'benchmark-day',
+    'KINESIS_STREAM_NAME': 'benchmark-sla',
+    'ALARM_NAME_PREFIX': 'data-gov',
+    'CENTRAL_SNS_TOPIC': 'benchmark',
+    'CENTRAL_ACCOUNT_NUMBER': '123412341234',
+    'catalogs': '123412341234',
+    'CHECKPOINT_STORE': 'sqlite',
+    'CHECKPOINT_PATH': os.path.join(STATE_DIR, 'checkpoints.db'),
+    'LOG_LEVEL': 'WARNING'
+}.items():
+    os.environ.setdefault(name, value)
+# add_partition is deployed from inside lambda/ and imports its siblings top-level
+sys.path.insert(0, os.path.join(ROOT, 'lambda'))
+
+from benchmarks.fakes import ( # pylint: disable=wrong-import-position
+    FakeCloudWatch,
+    FakeContext,
+    FakeGlue,
+    FakeKinesis,
+    FakeSNS,
+    synthetic_alarm_history,
+    synthetic_alarms,
+    synthetic_definition,
+    synthetic_notifications
+)
+
+metric_stream_producer = importlib.import_module('lambda.metric_stream_producer')
+sla_stream_producer = importlib.import_module('lambda.sla_stream_producer')
+alarm_history = importlib.import_module('lambda.alarm_history')
+windowing = importlib.import_module('lambda.windowing')
+kinesis_writer = importlib.import_module('lambda.kinesis_writer')
+record_aggregation = importlib.import_module('lambda.record_aggregation')
+sla_parse = importlib.import_module('lambda.sla_parse')
+add_partition = importlib.import_module('add_partition')
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+class Timer():
+    """
+    Accumulate wall-clock seconds per stage
+    """
+
+    def __init__(self) -> None:
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(self.stages.get(name, 0.0) + time.perf_counter() - start, 4)
+
+def fresh_checkpoints() -> None:
+    """Point the checkpoint store at an empty database."""
+    windowing.CHECKPOINT_PATH = tempfile.mktemp(suffix='.db', dir=STATE_DIR)
+    windowing.checkpoint_store.cache_clear()
+
+def result(benchmark: str, size: int, seconds: float, timer: Timer, *clients) -> dict:
+    calls = {}
+    for client in clients:
+        calls.update(client.calls)
+    return {
+        'Benchmark': benchmark,
+        'Size': size,
+        'Seconds': round(seconds, 4),
+        'PerSecond': round(size / seconds) if seconds else None,
+        'Stages': timer.stages,
+        'Calls': calls
+    }
+
+def bench_metric_producer(size: int, latency: float, throttle_rate: float) -> dict:
+    """Collect one minute window of size metrics, stage by stage and end to end."""
+    timer = Timer()
+    context = FakeContext()
+    with timer.stage('definition'):
+        definition = synthetic_definition(size)
+        stream = definition.metric_stream
+    cloudwatch = FakeCloudWatch(latency=latency)
+    kinesis = FakeKinesis(latency=latency, record_failure_rate=throttle_rate)
+    metric_stream_producer.CW_CLIENT = cloudwatch
+    metric_stream_producer.KINESIS_CLIENT = kinesis
+
+    end_time = windowing.align(datetime.now(timezone.utc), 60)
+    start_time = end_time - timedelta(seconds=60)
+    with timer.stage('plan'):
+        query_plan = metric_stream_producer.plan_queries(stream.metric_data_queries(frequency='minute'))
+    with timer.stage('fetch'):
+        metrics_data = metric_stream_producer.fetch_metric_data(
+            query_plan=query_plan,
+            end_time=end_time,
+            start_time=start_time
+        )
+    with timer.stage('translate'):
+        records = metric_stream_producer.translate_metrics_to_records(
+            metrics_data=metrics_data,
+            time=end_time,
+            event={'frequency': 'minute'},
+            context=context,
+            metric_sets=stream.metrics,
+            metric_index=stream.metric_index()
+        )
+    with timer.stage('put'):
+        kinesis_writer.KinesisBatchWriter(
+            client=kinesis,
+            stream_name='benchmark-minute',
+            base_delay=0.001
+        ).put_records(records)
+
+    fresh_checkpoints()
+    start = time.perf_counter()
+    with timer.stage('end_to_end'):
+        metric_stream_producer.main({'frequency': 'minute'}, context)
+    return result('metric_stream_producer', size, time.perf_counter() - start, timer, cloudwatch, kinesis)
+
+# The nested scan is quadratic, larger sizes would run for hours
+NESTED_SCAN_MAX_SIZE = 2000
+
+def nested_scan(metrics_data: list, metrics: list) -> int:
+    """Resolve results the way translation did before the unique_id index, by scanning every metric."""
+    matched = 0
+    for metric_object in metrics_data:
+        for metric in metrics:
+            if metric.unique_id() == metric_object['Id']:
+                matched += 1
+                break
+    return matched
+
+def bench_translate(size: int, latency: float, throttle_rate: float) -> dict:
+    """Translate one window of size results, indexed against the former nested scan."""
+    timer = Timer()
+    context = FakeContext()
+    with timer.stage('definition'):
+        definition = synthetic_definition(size)
+        stream = definition.metric_stream
+    metric_stream_producer.CW_CLIENT = FakeCloudWatch(latency=latency)
+    end_time = windowing.align(datetime.now(timezone.utc), 60)
+    metrics_data = metric_stream_producer.fetch_metric_data(
+        query_plan=metric_stream_producer.plan_queries(stream.metric_data_queries(frequency='minute')),
+        end_time=end_time,
+        start_time=end_time - timedelta(seconds=60)
+    )
+    if size <= NESTED_SCAN_MAX_SIZE:
+        with timer.stage('nested_scan'):
+            nested_scan(metrics_data, stream.metrics)
+
+    start = time.perf_counter()
+    with timer.stage('indexed'):
+        metric_stream_producer.translate_metrics_to_records(
+            metrics_data=metrics_data,
+            time=end_time,
+            event={'frequency': 'minute'},
+            context=context,
+            metric_sets=stream.metrics,
+            metric_index=stream.metric_index()
+        )
+    return result('translate', size, time.perf_counter() - start, timer)
+
+# Shards of the stream the aggregated records are packed for
+AGGREGATION_SHARDS = 4
+
+def bench_aggregation(size: int, latency: float, throttle_rate: float) -> dict:
+    """Encode one window of size results as JSON records and as aggregated records."""
+    timer = Timer()
+    context = FakeContext()
+    with timer.stage('definition'):
+        definition = synthetic_definition(size)
+        stream = definition.metric_stream
+    metric_stream_producer.CW_CLIENT = FakeCloudWatch(latency=latency)
+    end_time = windowing.align(datetime.now(timezone.utc), 60)
+    records = metric_stream_producer.translate_metrics_to_records(
+        metrics_data=metric_stream_producer.fetch_metric_data(
+            query_plan=metric_stream_producer.plan_queries(stream.metric_data_queries(frequency='minute')),
+            end_time=end_time,
+            start_time=end_time - timedelta(seconds=60)
+        ),
+        time=end_time,
+        event={'frequency': 'minute'},
+        context=context,
+        metric_sets=stream.metrics,
+        metric_index=stream.metric_index(),
+        record_encoding=metric_stream_producer.JSON_ENCODING
+    )
+
+    start = time.perf_counter()
+    with timer.stage('encode'):
+        encodings = record_aggregation.benchmark(
+            metric_objects=[json.loads(record['Data']) for record in records],
+            partition_keys=[record['PartitionKey'] for record in records],
+            iterations=1,
+            shard_count=AGGREGATION_SHARDS
+        )
+    report = result('aggregation', len(records), time.perf_counter() - start, timer)
+    report['Encodings'] = encodings
+    return report
+
+def bench_sla_producer(size: int, latency: float, throttle_rate: float) -> dict:
+    """Stream the state of size SLA alarms, stage by stage and end to end."""
+    timer = Timer()
+    context = FakeContext()
+    with timer.stage('definition'):
+        definition = synthetic_definition(size)
+    cloudwatch = FakeCloudWatch(alarms=synthetic_alarms(definition), latency=latency)
+    kinesis = FakeKinesis(latency=latency, record_failure_rate=throttle_rate)
+    sla_stream_producer.CW_CLIENT = cloudwatch
+    sla_stream_producer.KINESIS_CLIENT = kinesis
+
+    with timer.stage('describe'):
+        sla_data = sla_stream_producer.get_sla_data(alarmNamePrefix='data-gov')
+    with timer.stage('translate'):
+        records = sla_stream_producer.translate_clas_to_records(
+            slas_data=sla_data,
+            time=datetime.now(),
+            event={},
+            context=context,
+            metric_sets=definition.metric_stream.metrics,
+            alarm_index=definition.alarm_index(context.invoked_function_arn.split(":")[3])
+        )
+    with timer.stage('put'):
+        kinesis_writer.KinesisBatchWriter(
+            client=kinesis,
+            stream_name='benchmark-sla',
+            base_delay=0.001
+        ).put_records(records)
+
+    start = time.perf_counter()
+    with timer.stage('end_to_end'):
+        sla_stream_producer.main({}, context)
+    return result('sla_stream_producer', size, time.perf_counter() - start, timer, cloudwatch, kinesis)
+
+def bench_sla_history(size: int, latency: float, throttle_rate: float) -> dict:
+    """Stream size alarm transitions read from the alarm history."""
+    timer = Timer()
+    context = FakeContext()
+    with timer.stage('definition'):
+        definition = synthetic_definition(size)
+    now = datetime.now(timezone.utc)
+    start, end = alarm_history.history_range(now)
+    cloudwatch = FakeCloudWatch(
+        history=synthetic_alarm_history(synthetic_alarms(definition), start, end),
+        latency=latency
+    )
+    kinesis = FakeKinesis(latency=latency, record_failure_rate=throttle_rate)
+    sla_stream_producer.CW_CLIENT = cloudwatch
+    sla_stream_producer.KINESIS_CLIENT = kinesis
+
+    fresh_checkpoints()
+    start_time = time.perf_counter()
+    with timer.stage('end_to_end'):
+        sla_stream_producer.put_sla_transitions(
+            time=now.replace(tzinfo=None),
+            context=context,
+            alarm_index=definition.alarm_index(context.invoked_function_arn.split(":")[3])
+        )
+    return result('sla_history', size, time.perf_counter() - start_time, timer, cloudwatch, kinesis)
+
+def bench_sla_parse(size: int, latency: float, throttle_rate: float) -> dict:
+    """Forward an alarm storm of size notifications in one event to the central topic."""
+    timer = Timer()
+    context = FakeContext()
+    with timer.stage('definition'):
+        definition = synthetic_definition(size)
+        event = synthetic_notifications(synthetic_alarms(definition))
+    sns = FakeSNS(latency=latency, entry_failure_rate=throttle_rate)
+    sla_parse.SNS_CLIENT = sns
+
+    start = time.perf_counter()
+    with timer.stage('end_to_end'):
+        sla_parse.main(event, context)
+    return result('sla_parse', size, time.perf_counter() - start, timer, sns)
+
+def bench_add_partition(size: int, latency: float, throttle_rate: float) -> dict:
+    """Register partitions for size S3 object notifications spread over a week of hours."""
+    timer = Timer()
+    context = FakeContext()
+    glue = FakeGlue(latency=latency, throttle_rate=throttle_rate)
+    add_partition.glue_client = glue
+    add_partition.TABLE_CACHE = add_partition.TableDescriptorCache()
+
+    hour = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    events = []
+    for position in range(size):
+        at = hour + timedelta(hours=position % 168)
+        events.append({'Records': [{'s3': {
+            'bucket': {'name': 'benchmark'},
+            'object': {'key': f'metrics/minute/us-east-1/{at:%Y/%m/%d/%H}/part-{position}.parquet'}
+        }}]})
+
+    start = time.perf_counter()
+    with timer.stage('end_to_end'):
+        for event in events:
+            add_partition.main(event, context)
+    return result('add_partition', size, time.perf_counter() - start, timer, glue)
+
+BENCHMARKS = {
+    'metric': bench_metric_producer,
+    'translate': bench_translate,
+    'aggregation': bench_aggregation,
+    'sla': bench_sla_producer,
+    'history': bench_sla_history,
+    'notify': bench_sla_parse,
+    'partition': bench_add_partition
+}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every fake AWS call')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='probability a fake call or record is throttled')
+    parser.add_argument('--min-throughput', type=float, default=None, help='fail below this many items per second')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name in args.benchmarks:
+        for size in args.sizes:
+            report = BENCHMARKS[name](size, args.latency, args.throttle_rate)
+            print(json.dumps(report))
+            if args.min_throughput is not None and (report['PerSecond'] or 0) < args.min_throughput:
+                failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -33,7 +33,7 @@ class Alarm(core.Construct):
                 scope=self,
                 id='SLA-Alarm',
                 metric=self.cw_metric.cw_metric,
-                alarm_name='data-gov-'+id +'SLA-Alarm-'+core.Aws.REGION,
+                alarm_name=self.sla.alarm_name(core.Aws.REGION),
                 datapoints_to_alarm=self.sla.datapoints_to_alarm,
                 evaluation_periods=self.sla.evaluation_periods,
                 threshold=self.sla.threshold,
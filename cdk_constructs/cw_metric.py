@@ -5,7 +5,7 @@ from aws_cdk import (
 )
 
 from dataquality.sla import SLA
-from dataquality.metric import Metric
+from dataquality.metric import Metric, ExpressionMetric
 
 class CwMetric(core.Construct):
     """ CloudWatch Alarm Construct """
@@ -37,6 +37,14 @@ class CwMetric(core.Construct):
                     metric_name=self.sla.metric.name,
                     dimensions=dimensions
                 )
+        elif isinstance(metric, ExpressionMetric):
+            # CDK Math Expression
+            self.cw_metric = aws_cloudwatch.MathExpression(
+                    expression=self.metric.expression,
+                    using_metrics={},
+                    label=self.metric.label,
+                    period=core.Duration.seconds(self.metric.period)
+                )
         else:
             dimensions = {}
             if metric.dimensions:
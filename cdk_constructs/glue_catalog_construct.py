@@ -99,6 +99,12 @@ class GlueCatalogConstruct(core.Construct):
                         }, {
                             "name": "metricvalue",
                             "type": "float"
+                        }, {
+                            "name": "timestamps",
+                            "type": "array<string>"
+                        }, {
+                            "name": "values",
+                            "type": "array<double>"
                         }, {
                             "name": "id",
                             "type": "string"
@@ -194,6 +200,15 @@ class GlueCatalogConstruct(core.Construct):
                     }, {
                         "name": "metadata",
                         "type": "string"
+                    }, {
+                        "name": "changetype",
+                        "type": "string"
+                    }, {
+                        "name": "previousstatevalue",
+                        "type": "string"
+                    }, {
+                        "name": "transitiontime",
+                        "type": "string"
                     }], 
                     compressed=False, 
                     input_format='org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat', 
@@ -84,7 +84,8 @@ class LambdaConstruct(core.Construct):
                         actions=[
                             'glue:Get*',
                             'glue:Put*',
-                            'glue:CreatePartition'
+                            'glue:CreatePartition',
+                            'glue:BatchCreatePartition'
                         ],
                         resources=[
                             f'arn:aws:glue:{core.Aws.REGION}:*:catalog/*',
@@ -1,6 +1,7 @@
 """ Lambda Construct """
 from aws_cdk import (
     core,
+    aws_dynamodb,
     aws_iam,
     aws_lambda
 )
@@ -13,6 +14,9 @@ class MetricStreamerConstruct(core.Construct):
         scope: core.Construct,
         id: str, # pylint: disable=redefined-builtin
         stream_dict: dict,
+        collector: bool = False,
+        worker_shards: int = 1,
+        record_encoding: str = 'json',
         **_kwargs
     ):
         super().__init__(scope, id)
@@ -25,6 +29,18 @@ class MetricStreamerConstruct(core.Construct):
             if key.endswith("STREAM_ARN") == True:
                 self.stream_arns.append(value)
 
+        # Per-frequency collection watermarks, /tmp does not survive cold starts
+        self.checkpoint_table = aws_dynamodb.Table(
+            self,
+            id='checkpoint_table',
+            partition_key=aws_dynamodb.Attribute(
+                name='frequency',
+                type=aws_dynamodb.AttributeType.STRING
+            ),
+            billing_mode=aws_dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=core.RemovalPolicy.DESTROY
+        )
+
         self.function = aws_lambda.Function(
             self,
             id='stream_function',
@@ -42,11 +58,19 @@ class MetricStreamerConstruct(core.Construct):
                     ]
                 }
             ),
-            handler='lambda.metric_stream_producer.main',
-            timeout=core.Duration.minutes(10),
+            # The collector runs a scheduler loop for the whole timeout
+            handler='lambda.collector.main' if collector else 'lambda.metric_stream_producer.main',
+            timeout=core.Duration.minutes(15 if collector else 10),
             runtime=aws_lambda.Runtime.PYTHON_3_6,
-            environment=self.stream_names
+            environment={
+                **self.stream_names,
+                'CHECKPOINT_STORE': 'dynamodb',
+                'CHECKPOINT_TABLE_NAME': self.checkpoint_table.table_name,
+                'WORKER_SHARDS': str(worker_shards),
+                'RECORD_ENCODING': record_encoding
+            }
         )
+        self.checkpoint_table.grant_read_write_data(self.function)
 
         get_policy = aws_iam.PolicyStatement(
             effect=aws_iam.Effect.ALLOW,
@@ -65,6 +89,8 @@ class MetricStreamerConstruct(core.Construct):
             ],
             actions=[
                 'kinesis:PutRecords',
+                # Aggregated records are packed per shard of the stream
+                'kinesis:DescribeStreamSummary',
                 'dynamodb:DescribeTable',
                 'dynamodb:ListTagsOfResource',
                 'dynamodb:GetItem',
@@ -76,4 +102,18 @@ class MetricStreamerConstruct(core.Construct):
                 'kms:ReEncrypt'
             ]
         )
-        self.function.add_to_role_policy(resource_policy)
\ No newline at end of file
+        self.function.add_to_role_policy(resource_policy)
+
+        if worker_shards > 1:
+            # The coordinator invokes its own function per shard, a name
+            # pattern avoids a circular reference to the function ARN
+            invoke_policy = aws_iam.PolicyStatement(
+                effect=aws_iam.Effect.ALLOW,
+                resources=[
+                    f'arn:aws:lambda:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:function:{core.Stack.of(self).stack_name}-*'
+                ],
+                actions=[
+                    'lambda:InvokeFunction'
+                ]
+            )
+            self.function.add_to_role_policy(invoke_policy)
\ No newline at end of file
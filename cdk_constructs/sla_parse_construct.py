@@ -2,7 +2,9 @@
 from aws_cdk import (
     core,
     aws_iam,
-    aws_lambda
+    aws_lambda,
+    aws_lambda_event_sources,
+    aws_sqs
 )
 
 class SlaParseConstruct(core.Construct):
@@ -15,37 +17,83 @@ class SlaParseConstruct(core.Construct):
         id: str, # pylint: disable=redefined-builtin
         central_account_number: int,
         central_sns_topic: str,
+        coalesce_window_seconds: int = 0,
         **_kwargs
     ):
         super().__init__(scope, id)
         self.central_sns_topic = central_sns_topic
         self.central_account_number = central_account_number
+        code = aws_lambda.Code.from_asset(
+            path='.',
+            exclude=['cdk.out'],
+            bundling={
+                # pylint: disable=no-member 
+                # bundling_docker_image is there.
+                'image': aws_lambda.Runtime.PYTHON_3_6.bundling_docker_image,
+                'command': [
+                    'bash',
+                    '-c',
+                    'cp -r dataquality/ /asset-output/ && cp -r lambda/ /asset-output/ && cp -r definitions/ /asset-output/ && cp -r accounts/ /asset-output/'
+                ]
+            }
+        )
+        environment = {
+            'CENTRAL_SNS_TOPIC': self.central_sns_topic,
+            'CENTRAL_ACCOUNT_NUMBER': self.central_account_number
+        }
+
+        self.queue = None
+        self.dead_letter_queue = None
+        if coalesce_window_seconds:
+            # Notifications the coalesce function keeps failing on, kept for inspection
+            self.dead_letter_queue = aws_sqs.Queue(
+                self,
+                id='notification_dead_letter_queue',
+                retention_period=core.Duration.days(14)
+            )
+            # Visibility must cover the coalesce function's timeout
+            self.queue = aws_sqs.Queue(
+                self,
+                id='notification_queue',
+                visibility_timeout=core.Duration.minutes(60),
+                dead_letter_queue=aws_sqs.DeadLetterQueue(
+                    max_receive_count=5,
+                    queue=self.dead_letter_queue
+                )
+            )
+            environment['NOTIFICATION_QUEUE'] = 'sqs'
+            environment['NOTIFICATION_QUEUE_URL'] = self.queue.queue_url
+
         self.function = aws_lambda.Function(
             self,
             id='rewrite_function',
-            code=aws_lambda.Code.from_asset(
-                path='.',
-                exclude=['cdk.out'],
-                bundling={
-                    # pylint: disable=no-member 
-                    # bundling_docker_image is there.
-                    'image': aws_lambda.Runtime.PYTHON_3_6.bundling_docker_image,
-                    'command': [
-                        'bash',
-                        '-c',
-                        'cp -r dataquality/ /asset-output/ && cp -r lambda/ /asset-output/ && cp -r definitions/ /asset-output/ && cp -r accounts/ /asset-output/'
-                    ]
-                }
-            ),
+            code=code,
             handler='lambda.sla_parse.main',
             timeout=core.Duration.minutes(10),
             runtime=aws_lambda.Runtime.PYTHON_3_6,
-            environment={
-                'CENTRAL_SNS_TOPIC': self.central_sns_topic,
-                'CENTRAL_ACCOUNT_NUMBER': self.central_account_number
-            }
+            environment=environment
         )
 
+        functions = [self.function]
+        if self.queue is not None:
+            self.queue.grant_send_messages(self.function)
+            self.coalesce_function = aws_lambda.Function(
+                self,
+                id='coalesce_function',
+                code=code,
+                handler='lambda.sla_parse.coalesce_main',
+                timeout=core.Duration.minutes(10),
+                runtime=aws_lambda.Runtime.PYTHON_3_6,
+                environment=environment
+            )
+            # The batching window is the coalescing window, up to the 5 minute SQS maximum
+            self.coalesce_function.add_event_source(aws_lambda_event_sources.SqsEventSource(
+                queue=self.queue,
+                batch_size=10000,
+                max_batching_window=core.Duration.seconds(min(coalesce_window_seconds, 300))
+            ))
+            functions.append(self.coalesce_function)
+
         #Resource specific policy
         resource_policy = aws_iam.PolicyStatement(
             effect=aws_iam.Effect.ALLOW,
@@ -66,4 +114,5 @@ class SlaParseConstruct(core.Construct):
                 'kms:ReEncrypt'
             ]
         )
-        self.function.add_to_role_policy(resource_policy)
+        for function in functions:
+            function.add_to_role_policy(resource_policy)
@@ -1,6 +1,7 @@
 """ Lambda Construct """
 from aws_cdk import (
     core,
+    aws_dynamodb,
     aws_iam,
     aws_lambda
 )
@@ -15,11 +16,52 @@ class SLAStreamerConstruct(core.Construct):
         id: str, # pylint: disable=redefined-builtin
         stream_name: str,
         stream_arn: str,
+        stream_mode: str = 'snapshot',
+        snapshot_interval_minutes: int = 0,
         **_kwargs
     ):
         super().__init__(scope, id)
         self.stream_name = stream_name
 
+        environment = {
+            'KINESIS_STREAM_NAME': self.stream_name,
+            'ALARM_NAME_PREFIX': 'data-gov',
+            'SLA_STREAM_MODE': stream_mode,
+            'SLA_SNAPSHOT_INTERVAL_MINUTES': str(snapshot_interval_minutes)
+        }
+
+        self.snapshot_table = None
+        if stream_mode == 'cdc':
+            # Alarm fingerprints for change data capture, /tmp does not survive cold starts
+            self.snapshot_table = aws_dynamodb.Table(
+                self,
+                id='snapshot_table',
+                partition_key=aws_dynamodb.Attribute(
+                    name='alarm_name',
+                    type=aws_dynamodb.AttributeType.STRING
+                ),
+                billing_mode=aws_dynamodb.BillingMode.PAY_PER_REQUEST,
+                removal_policy=core.RemovalPolicy.DESTROY
+            )
+            environment['SNAPSHOT_STORE'] = 'dynamodb'
+            environment['SNAPSHOT_TABLE_NAME'] = self.snapshot_table.table_name
+
+        self.checkpoint_table = None
+        if stream_mode == 'history':
+            # Alarm history watermark
+            self.checkpoint_table = aws_dynamodb.Table(
+                self,
+                id='checkpoint_table',
+                partition_key=aws_dynamodb.Attribute(
+                    name='frequency',
+                    type=aws_dynamodb.AttributeType.STRING
+                ),
+                billing_mode=aws_dynamodb.BillingMode.PAY_PER_REQUEST,
+                removal_policy=core.RemovalPolicy.DESTROY
+            )
+            environment['CHECKPOINT_STORE'] = 'dynamodb'
+            environment['CHECKPOINT_TABLE_NAME'] = self.checkpoint_table.table_name
+
         self.function = aws_lambda.Function(
             self,
             id='sla_stream_function',
@@ -40,18 +82,19 @@ class SLAStreamerConstruct(core.Construct):
             handler='lambda.sla_stream_producer.main',
             timeout=core.Duration.minutes(10),
             runtime=aws_lambda.Runtime.PYTHON_3_6,
-            environment={
-                'KINESIS_STREAM_NAME': self.stream_name,
-                'ALARM_NAME_PREFIX': 'data-gov'
-            }
+            environment=environment
         )
+        if self.snapshot_table is not None:
+            self.snapshot_table.grant_read_write_data(self.function)
+        if self.checkpoint_table is not None:
+            self.checkpoint_table.grant_read_write_data(self.function)
 
         get_policy = aws_iam.PolicyStatement(
             effect=aws_iam.Effect.ALLOW,
             resources=['*'],
             actions=[
                 'cloudwatch:DescribeAlarms'
-            ]
+            ] + (['cloudwatch:DescribeAlarmHistory'] if stream_mode == 'history' else [])
         )
         self.function.add_to_role_policy(get_policy)
 
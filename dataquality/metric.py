@@ -115,6 +115,18 @@ class Metric():
 
         }
 
+    def metric_data_query(self, metric_id: str = None) -> dict:
+        """Return the GetMetricData MetricDataQuery for this metric."""
+
+        return {
+            'Id': metric_id or self.unique_id(),
+            'MetricStat': {
+                'Metric': self.api_structure(),
+                'Period': self.period,
+                'Stat': self.statistic
+            }
+        }
+
     def widget_title(self) -> str:
         """Generate title for the CloudWatch Widgets"""
 
@@ -154,6 +166,68 @@ class Metric():
 
         return sub(r'\W+', '', metric_id).lower()
 
+class ExpressionMetric(Metric):
+    """
+    Metric computed by a SEARCH or metric math expression
+
+    A single query expands server-side into every matching series. The
+    expression must be self-contained, it cannot reference the ids of other
+    queries. namespace, name and statistic describe the resulting series in
+    records and dashboards. Results are told apart by their Label; with
+    label_dimension set, each Label is recorded as that dimension's value.
+    """
+    expression: str
+    label: str
+    label_dimension: str
+
+    def __init__(
+        self,
+        expression: str,
+        *args,
+        label: str = None,
+        label_dimension: str = None,
+        **kwargs
+    ) -> None:
+        self.expression = expression
+        self.label = label
+        self.label_dimension = label_dimension
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def search(
+        namespace: str,
+        name: str,
+        dimension_names: List[str],
+        statistic: str,
+        period: int,
+        filters: Dict[str, str] = None
+    ) -> str:
+        """Build a SEARCH expression over every series of a metric in a schema."""
+
+        schema = ','.join([namespace] + list(dimension_names))
+        terms = [f'MetricName="{name}"'] + [
+            f'{key}="{value}"' for key, value in (filters or {}).items()
+        ]
+        return f"SEARCH('{{{schema}}} {' '.join(terms)}', '{statistic}', {period})"
+
+    def api_structure(self) -> dict:
+        """Expression metrics have no single boto3 Metric structure."""
+
+        raise TypeError(f"{type(self).__name__} is queried by expression, not MetricStat")
+
+    def metric_data_query(self, metric_id: str = None) -> dict:
+        """Return the GetMetricData expression query for this metric."""
+
+        query = {
+            'Id': metric_id or self.unique_id(),
+            'Expression': self.expression,
+            'Period': self.period,
+            'ReturnData': True
+        }
+        if self.label:
+            query['Label'] = self.label
+        return query
+
 class DataSetMetric(Metric):
     """DataSetMetric"""
     dataset: Dataset
@@ -22,12 +22,12 @@ class MetricSet():
         schedule: str = None
     ) -> None:
         self.name = name
-        self.metrics = metrics
+        self.metrics = list(metrics)
         self.schedule = schedule
 
     def add(self, metric: Metric):
         """ Add metric. """
-        self.metrics = self.metrics + (metric,)
+        self.metrics.append(metric)
 
 class BusinessMetricSet(MetricSet):
     """Business Metric Set"""
@@ -41,8 +41,8 @@ class SLASet():
         self,
         slas: List[SLA] = ()
     ) -> None:
-        self.slas = slas
+        self.slas = list(slas)
 
     def add(self, sla: SLA):
         """ Add SLA. """
-        self.slas = self.slas + (sla,)
+        self.slas.append(sla)
@@ -1,5 +1,10 @@
 """ SLA """
-from dataquality.metric import Metric
+from dataquality.metric import Metric, ExpressionMetric
+
+def alarm_name(metric: Metric, region: str) -> str:
+    """Name of the CloudWatch SLA alarm on metric in region."""
+
+    return 'data-gov-' + metric.alarm_unique_id() + 'SLA-Alarm-' + region
 
 class SLA():
     """ SLA """
@@ -19,6 +24,9 @@ class SLA():
         evaluation_periods: int = 1,
         sns_enabled: bool = False
     ) -> None:
+        if isinstance(metric, ExpressionMetric):
+            # CloudWatch alarms do not accept SEARCH expressions
+            raise TypeError(f"SLAs are not supported on {type(metric).__name__}, alarm on a Metric instead")
         self.sla_set = sla_set
         self.metric = metric
         self.threshold = threshold
@@ -30,4 +38,9 @@ class SLA():
         self.details = details
         self.sla_set.add(self)
         self.severity = severity
-        self.sns_enabled = sns_enabled
\ No newline at end of file
+        self.sns_enabled = sns_enabled
+
+    def alarm_name(self, region: str) -> str:
+        """Name of the CloudWatch alarm for this SLA in region."""
+
+        return alarm_name(self.metric, region)
@@ -1,5 +1,9 @@
 """Stream"""
-from typing import List
+from typing import (
+    Dict,
+    List
+)
+from .metric import Metric
 from .set import (
     MetricSet
 )
@@ -16,30 +20,31 @@ class MetricStream():
     ) -> None:
         self.metric_sets = metric_sets
         self.metrics = []
+        self._metric_index = None
 
         # Flatten metrics into single list
         for metric_set in self.metric_sets:
             self.metrics += metric_set.metrics
 
+    def metric_index(self) -> Dict[str, Metric]:
+        """Return metrics keyed by unique_id, built once per stream."""
+
+        if self._metric_index is None:
+            self._metric_index = {
+                metric.unique_id(): metric for metric in self.metrics
+            }
+        return self._metric_index
+
     def metric_data_queries(self, frequency) -> list:
         """Return MetricDataQueries"""
 
         metric_data_queries = []
 
-        for metric in self.metrics:
+        for metric_id, metric in self.metric_index().items():
 
             if metric.frequency != frequency:
                 continue
 
-            metric_data_query = {
-                'Id': metric.unique_id(),
-                'MetricStat': {
-                    'Metric': metric.api_structure(),
-                    'Period': metric.period,
-                    'Stat': metric.statistic
-
-                }
-            }
-            metric_data_queries.append(metric_data_query)
+            metric_data_queries.append(metric.metric_data_query(metric_id))
 
         return metric_data_queries
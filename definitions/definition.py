@@ -2,37 +2,162 @@
 import os
 import importlib
 import glob
+import hashlib
 import zipfile
 import json
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 from accounts.accounts import fetch_account_streamers
+from dataquality.stream import MetricStream
+from definitions.manifest import (
+    compile_manifest,
+    load_manifest,
+    manifest_path,
+    write_manifest
+)
+
+# Definition files executed concurrently when greater than 1
+DEFINITION_LOAD_WORKERS = int(os.environ.get('DEFINITION_LOAD_WORKERS', '1'))
+
+# Warm container cache of account -> (fingerprint, Definition)
+_DEFINITION_CACHE = {}
  
 class Definition():
     """ Aggregated Definitions """
     metric_sets: List
     sla_sets: List
-    def __init__(self, account):
+    def __init__(self, account, use_manifest: bool = True, fingerprint: str = None):
+        """
+        Load the account's manifest, or execute its definition modules when
+        there is none. With fingerprint, the content fingerprint of the
+        definition files, a manifest compiled from other content is stale
+        and the modules are executed instead.
+        """
  
         self.metric_sets: List = []
         self.sla_sets: List = []
         self.account_definitions = []
+        self.content_fingerprint = fingerprint
+        self._metric_stream = None
+        self._metric_index = None
+        self._sla_index = {}
+        self._alarm_index = {}
+        account_dir = Definition.account_directory(account)
+        manifest = None
+        if use_manifest and os.path.isfile(manifest_path(account_dir)):
+            manifest = load_manifest(manifest_path(account_dir))
+            if fingerprint is not None and manifest['fingerprint'] != fingerprint:
+                manifest = None
+        if manifest is not None:
+            # Precompiled at synth time, no definition module is executed
+            self.metric_sets = manifest['metric_sets']
+            self.sla_sets = manifest['sla_sets']
+            self._metric_index = manifest['metric_index']
+            self.content_fingerprint = manifest['fingerprint']
+        else:
+            self.iterate_definitions(os.path.join(account_dir, '**/*'))
+
+    @property
+    def metric_stream(self) -> MetricStream:
+        """ MetricStream over all metric sets, built once per definition. """
+        if self._metric_stream is None:
+            self._metric_stream = MetricStream(metric_sets=self.metric_sets)
+            if self._metric_index is not None:
+                self._metric_stream._metric_index = self._metric_index
+        return self._metric_stream
+
+    def sla_index(self, region: str) -> dict:
+        """ SLAs keyed by the name of their CloudWatch alarm in region, built once per definition. """
+        if region not in self._sla_index:
+            self._sla_index[region] = {
+                sla.alarm_name(region): sla
+                for sla_set in self.sla_sets
+                for sla in sla_set.slas
+            }
+        return self._sla_index[region]
+
+    def alarm_index(self, region: str) -> dict:
+        """ Metrics keyed by the name of their SLA's CloudWatch alarm in region, built once per definition. """
+        if region not in self._alarm_index:
+            self._alarm_index[region] = {
+                name: sla.metric for name, sla in self.sla_index(region).items()
+            }
+        return self._alarm_index[region]
+
+    @staticmethod
+    def compile(account) -> 'Definition':
+        """ Execute the account definitions and write their manifest. """
+        definition = Definition(account=account, use_manifest=False)
+        write_manifest(
+            manifest_path(Definition.account_directory(account)),
+            compile_manifest(
+                metric_sets=definition.metric_sets,
+                sla_sets=definition.sla_sets,
+                fingerprint=Definition.fingerprint(account)
+            )
+        )
+        return definition
+
+    @staticmethod
+    def account_directory(account) -> str:
+        """ Return the account definitions directory, extracting the zip if needed. """
         try:
-            trying = os.listdir(os.path.join(
+            account_dir = os.path.join(
                 os.path.dirname(os.path.realpath(__file__)),
                 f'account_{account}'
-            ))
-            dir_path = os.path.join(
-                os.path.dirname(
-                    os.path.realpath(__file__)),f'account_{account}', '**/*'
-                )
-            self.iterate_definitions(dir_path)
+            )
+            os.listdir(account_dir)
         except NotADirectoryError:
             with zipfile.ZipFile('/tmp/definitions.zip', 'r') as zip_ref:
                 zip_ref.extractall('/tmp')
-            dir_path = os.path.join(
-                f'/tmp/definitions/account_{account}', '**/*'
-                )
-            self.iterate_definitions(dir_path)
+            account_dir = f'/tmp/definitions/account_{account}'
+        return account_dir
+
+    @staticmethod
+    def fingerprint(account) -> str:
+        """ Content fingerprint of every definition file for an account. """
+        account_dir = Definition.account_directory(account)
+        digest = hashlib.sha256()
+        for filename in sorted(glob.iglob(os.path.join(account_dir, '**/*'), recursive=True)):
+            if os.path.isfile(filename) and filename.endswith('.py'):
+                digest.update(os.path.relpath(filename, account_dir).encode('utf-8'))
+                with open(filename, 'rb') as definition_file:
+                    digest.update(definition_file.read())
+        return digest.hexdigest()
+
+    @staticmethod
+    def cached(account, revalidate: bool = False) -> 'Definition':
+        """
+        Return the Definition for an account from the warm container cache.
+        Definitions only change on deploy, so warm invocations skip loading
+        entirely unless revalidate is set, in which case the content
+        fingerprint is recomputed and the definition reloaded on change.
+        """
+        cached = _DEFINITION_CACHE.get(account)
+        if cached is not None and not revalidate:
+            return cached[1]
+
+        if not revalidate:
+            # A cold start trusts the fingerprint stored in the manifest
+            definition = Definition(account=account)
+            _DEFINITION_CACHE[account] = (definition.content_fingerprint, definition)
+            return definition
+
+        fingerprint = Definition.fingerprint(account)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        definition = Definition(account=account, fingerprint=fingerprint)
+        _DEFINITION_CACHE[account] = (fingerprint, definition)
+        return definition
+
+    @staticmethod
+    def invalidate(account=None) -> None:
+        """ Drop cached definitions for one account, or all accounts. """
+        if account is None:
+            _DEFINITION_CACHE.clear()
+        else:
+            _DEFINITION_CACHE.pop(account, None)
 
     def iterate_definitions(self, dir_path):
         """ Iterate through the modules. """
@@ -45,31 +170,34 @@ class Definition():
 
     def generate_sla_metrics(self):
         """ Generate SLAs and metrics. """
-        for module in self.account_definitions:
+        if DEFINITION_LOAD_WORKERS > 1 and len(self.account_definitions) > 1:
+            with ThreadPoolExecutor(max_workers=DEFINITION_LOAD_WORKERS) as executor:
+                # map keeps the file order, so results match a sequential load
+                modules = list(executor.map(Definition.load_module, self.account_definitions))
+        else:
+            modules = [Definition.load_module(module) for module in self.account_definitions]
 
-            metric_spec = Definition.return_spec(
-                type_set='metric_set',
-                module=module
-            )
- 
-            metric_module = importlib.util.module_from_spec(metric_spec)
-            metric_spec.loader.exec_module(metric_module)
+        for definition_module in modules:
             try:
-                self.metric_sets.append(metric_module.metric_set)
+                self.metric_sets.append(definition_module.metric_set)
             except AttributeError as _ex:
                 print("Module has no attribute metric_set")
-            sla_spec = Definition.return_spec(
-                type_set='sla_set',
-                module=module
-            )
- 
-            sla_module = importlib.util.module_from_spec(sla_spec)
-            sla_spec.loader.exec_module(sla_module)
             try:
-                self.sla_sets.append(sla_module.sla_set)
+                self.sla_sets.append(definition_module.sla_set)
             except AttributeError as _ex:
                 print("Module has no attribute sla_set")
-                
+
+    @staticmethod
+    def load_module(module):
+        """ Execute a definition module once and return its namespace. """
+        spec = Definition.return_spec(
+            type_set='definition',
+            module=module
+        )
+        definition_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(definition_module)
+        return definition_module
+
     @staticmethod
     def return_spec(type_set, module):
         """ Static Method to return the file spec. """
@@ -89,7 +217,7 @@ class DefinitionSet():
         
         accounts = fetch_account_streamers(account)
         for acc in accounts:
-            defenition = Definition(account=acc)
+            defenition = Definition(account=acc, use_manifest=False)
             for metric_set in defenition.metric_sets:
                 for metric in metric_set.metrics:
                     metric_details = metric.__dict__
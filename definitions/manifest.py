@@ -0,0 +1,199 @@
+""" Definitions Manifest """
+import os
+import json
+from typing import List
+
+from dataquality.dataset import Dataset
+from dataquality.metric import (
+    Metric,
+    ExpressionMetric,
+    DataSetMetric,
+    BusinessMetric,
+    Dimension,
+    Metadata,
+    Widget
+)
+from dataquality.set import (
+    MetricSet,
+    BusinessMetricSet,
+    SLASet
+)
+from dataquality.sla import SLA
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+
+METRIC_CLASSES = {
+    cls.__name__: cls for cls in (Metric, ExpressionMetric, DataSetMetric, BusinessMetric)
+}
+METRIC_SET_CLASSES = {
+    cls.__name__: cls for cls in (MetricSet, BusinessMetricSet)
+}
+
+SLA_FIELDS = (
+    'short_description',
+    'details',
+    'threshold',
+    'comparison_operator',
+    'treat_missing_data',
+    'severity',
+    'datapoints_to_alarm',
+    'evaluation_periods',
+    'sns_enabled'
+)
+
+def manifest_path(account_dir: str) -> str:
+    """ Return the manifest location inside an account definitions directory. """
+    return os.path.join(account_dir, MANIFEST_FILE)
+
+def compile_manifest(metric_sets: List, sla_sets: List, fingerprint: str = None) -> dict:
+    """
+    Serialize fully resolved metric sets and SLA sets, together with their
+    unique ids, into a manifest dictionary.
+    """
+    datasets = []
+    dataset_index = {}
+    metric_index = {}
+
+    def dataset_ref(dataset):
+        if id(dataset) not in dataset_index:
+            dataset_index[id(dataset)] = len(datasets)
+            datasets.append(dict(dataset.__dict__))
+        return dataset_index[id(dataset)]
+
+    manifest_metric_sets = []
+    metrics = []
+    for metric_set in metric_sets:
+        manifest_metric_set = {
+            'class': type(metric_set).__name__,
+            'name': metric_set.name,
+            'schedule': metric_set.schedule,
+            'metrics': []
+        }
+        for metric in metric_set.metrics:
+            metric_index[id(metric)] = len(metrics)
+            manifest_metric_set['metrics'].append(len(metrics))
+            manifest_metric = {
+                'class': type(metric).__name__,
+                'namespace': metric.namespace,
+                'name': metric.name,
+                'frequency': metric.frequency,
+                'statistic': metric.statistic,
+                'period': metric.period,
+                'metadata': [[meta.name, meta.value] for meta in metric.metadata or []],
+                'dimensions': [[dimension.name, dimension.value] for dimension in metric.dimensions or []],
+                'dashboard': [metric.dashboard.dashboard_name, metric.dashboard.dashboard_category],
+                'unique_id': metric.unique_id(),
+                'alarm_unique_id': metric.alarm_unique_id()
+            }
+            if metric.metadata is None:
+                manifest_metric['metadata'] = None
+            if metric.dimensions is None:
+                manifest_metric['dimensions'] = None
+            if isinstance(metric, ExpressionMetric):
+                manifest_metric['expression'] = [metric.expression, metric.label, metric.label_dimension]
+            if isinstance(metric, DataSetMetric):
+                manifest_metric['dataset'] = dataset_ref(metric.dataset)
+            if isinstance(metric, BusinessMetric):
+                manifest_metric['business_query'] = metric.query
+                manifest_metric['reference_datasets'] = [
+                    dataset_ref(dataset) for dataset in metric.reference_datasets
+                ]
+            metrics.append(manifest_metric)
+        manifest_metric_sets.append(manifest_metric_set)
+
+    manifest_sla_sets = []
+    for sla_set in sla_sets:
+        manifest_sla_sets.append([
+            dict(
+                {field: getattr(sla, field) for field in SLA_FIELDS},
+                metric=metric_index[id(sla.metric)]
+            )
+            for sla in sla_set.slas
+        ])
+
+    return {
+        'version': MANIFEST_VERSION,
+        'fingerprint': fingerprint,
+        'datasets': datasets,
+        'metrics': metrics,
+        'metric_sets': manifest_metric_sets,
+        'sla_sets': manifest_sla_sets
+    }
+
+def write_manifest(path: str, manifest: dict) -> None:
+    """ Write a compact manifest file. """
+    with open(path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, separators=(',', ':'))
+
+def load_manifest(path: str) -> dict:
+    """
+    Rebuild metric sets and SLA sets from a manifest without executing the
+    definition modules. Returns metric_sets, sla_sets, metric_index, the
+    unique_id -> Metric map stored in the manifest, and the fingerprint of
+    the definition files it was compiled from.
+    """
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported definitions manifest version {manifest.get('version')}")
+
+    datasets = [Dataset(**dataset) for dataset in manifest['datasets']]
+    dashboards = {}
+
+    metrics = [None] * len(manifest['metrics'])
+    metric_sets = []
+    metric_index = {}
+    for manifest_metric_set in manifest['metric_sets']:
+        metric_set = METRIC_SET_CLASSES[manifest_metric_set['class']](
+            manifest_metric_set['name'],
+            schedule=manifest_metric_set['schedule']
+        )
+        for position in manifest_metric_set['metrics']:
+            manifest_metric = manifest['metrics'][position]
+            dashboard_key = tuple(manifest_metric['dashboard'])
+            if dashboard_key not in dashboards:
+                dashboards[dashboard_key] = Widget(*dashboard_key)
+            kwargs = {
+                'namespace': manifest_metric['namespace'],
+                'name': manifest_metric['name'],
+                'frequency': manifest_metric['frequency'],
+                'statistic': manifest_metric['statistic'],
+                'period': manifest_metric['period'],
+                'dashboard': dashboards[dashboard_key],
+                'metric_set': metric_set,
+                'metadata': None if manifest_metric['metadata'] is None else [
+                    Metadata(name=name, value=value) for name, value in manifest_metric['metadata']
+                ],
+                'dimensions': None if manifest_metric['dimensions'] is None else [
+                    Dimension(name=name, value=value) for name, value in manifest_metric['dimensions']
+                ]
+            }
+            if 'expression' in manifest_metric:
+                kwargs['expression'], kwargs['label'], kwargs['label_dimension'] = manifest_metric['expression']
+            if 'dataset' in manifest_metric:
+                kwargs['dataset'] = datasets[manifest_metric['dataset']]
+            if 'business_query' in manifest_metric:
+                kwargs['query'] = manifest_metric['business_query']
+                kwargs['reference_datasets'] = [
+                    datasets[dataset] for dataset in manifest_metric['reference_datasets']
+                ]
+            metric = METRIC_CLASSES[manifest_metric['class']](**kwargs)
+            metrics[position] = metric
+            metric_index[manifest_metric['unique_id']] = metric
+        metric_sets.append(metric_set)
+
+    sla_sets = []
+    for manifest_sla_set in manifest['sla_sets']:
+        sla_set = SLASet()
+        for manifest_sla in manifest_sla_set:
+            kwargs = {field: manifest_sla[field] for field in SLA_FIELDS}
+            SLA(sla_set=sla_set, metric=metrics[manifest_sla['metric']], **kwargs)
+        sla_sets.append(sla_set)
+
+    return {
+        'metric_sets': metric_sets,
+        'sla_sets': sla_sets,
+        'metric_index': metric_index,
+        'fingerprint': manifest.get('fingerprint')
+    }
@@ -1,9 +1,80 @@
 import os
-import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.exceptions import ClientError
+
+from log import get_logger
+
+# BatchCreatePartition accepts at most 100 partitions
+MAX_BATCH_CREATE_PARTITIONS = 100
+
+# Seconds a cached table descriptor is trusted before it is revalidated
+TABLE_CACHE_TTL_SECONDS = float(os.environ.get('TABLE_CACHE_TTL_SECONDS', '300'))
 
 catalogs = os.environ['catalogs'].split(',')
 glue_client = boto3.client('glue')
+LOGGER = get_logger(__name__)
+
+class TableDescriptorCache():
+    """
+    Warm container cache of the storage descriptor fields partitions copy
+    from their table. Entries are refetched after ttl seconds, and dropped
+    when a partition write fails against a table that no longer matches.
+    Changes within the ttl that partition writes accept are not detected.
+    """
+    ttl: float
+
+    def __init__(self, ttl: float = TABLE_CACHE_TTL_SECONDS) -> None:
+        self.ttl = ttl
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, database: str, table: str) -> dict:
+        """Return the table's descriptor fields, fetching them when missing or expired."""
+        key = (database, table)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and now < entry['expires']:
+                self.hits += 1
+                return entry['descriptor']
+            self.misses += 1
+
+        table_response = glue_client.get_table(
+            DatabaseName=database,
+            Name=table
+        )
+        storage_descriptor = table_response['Table']['StorageDescriptor']
+        descriptor = {
+            'InputFormat': storage_descriptor['InputFormat'],
+            'OutputFormat': storage_descriptor['OutputFormat'],
+            'Location': storage_descriptor['Location'],
+            'SerdeInfo': storage_descriptor['SerdeInfo']
+        }
+        with self._lock:
+            self.entries[key] = {'descriptor': descriptor, 'expires': now + self.ttl}
+        return descriptor
+
+    def invalidate(self, database: str, table: str) -> None:
+        """Drop a table so the next get refetches it."""
+        with self._lock:
+            self.entries.pop((database, table), None)
+
+    def stats(self) -> dict:
+        """Hit and miss counts over the container's lifetime."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'tables': len(self.entries)
+        }
+
+TABLE_CACHE = TableDescriptorCache()
 
 def main(
     event: dict,
@@ -11,10 +82,36 @@ def main(
 ) -> None:
     """Lambda Handler."""
     database='data_governance'
-    key=event['Records'][0]['s3']['object']['key']
-    bucket=event['Records'][0]['s3']['bucket']['name']
-    print(event)
+    LOGGER.dump("S3 event", event)
+
+    # Objects of the same hour share a partition, register each once
+    tables = {}
+    for record in event['Records']:
+        key=record['s3']['object']['key']
+        bucket=record['s3']['bucket']['name']
+        LOGGER.debug("Object created", bucket=bucket, key=key)
+        table, values = partition_target(key)
+        tables.setdefault(table, {})[values] = None
+    LOGGER.info(
+        "Objects created",
+        object_count=len(event['Records']),
+        partition_count=sum(len(partitions) for partitions in tables.values())
+    )
+
+    for table, partitions in tables.items():
+        try:
+            register_partitions(database, table, list(partitions))
+        except ClientError as ex:
+            # The table may have been recreated since it was cached, retry once against a fresh descriptor
+            if ex.response.get('Error', {}).get('Code') not in ('EntityNotFoundException', 'InvalidInputException'):
+                raise ex
+            LOGGER.warning("Partition write failed, refreshing table descriptor", table=table, error=repr(ex))
+            TABLE_CACHE.invalidate(database, table)
+            register_partitions(database, table, list(partitions))
+    LOGGER.info("Table descriptor cache", **TABLE_CACHE.stats())
 
+def partition_target(key: str):
+    """Return the table and (region, year, month, day, hour) partition values of an object key."""
     # Metrics tables are separated by frequency
     if 'metrics/' in key:
         table=key.split('/')[0]+'_'+key.split('/')[1]
@@ -31,41 +128,63 @@ def main(
         month=key.split('/')[3]
         day=key.split('/')[4]
         hour=key.split('/')[5]
+    return table, (region, year, month, day, hour)
 
-    table_response = glue_client.get_table(
-        DatabaseName=database,
-        Name=table
-    )
-    input_format = table_response['Table']['StorageDescriptor']['InputFormat']
-    output_format = table_response['Table']['StorageDescriptor']['OutputFormat']
-    table_location = table_response['Table']['StorageDescriptor']['Location']
-    serde_info = table_response['Table']['StorageDescriptor']['SerdeInfo']
-    
-    input_dict = {
-        'Values': [
-            region, year, month, day, hour
-        ],
+def register_partitions(database, table, partitions) -> None:
+    """Create the partitions in every catalog that lacks them, catalogs in parallel."""
+    descriptor = TABLE_CACHE.get(database, table)
+    partition_inputs = [{
+        'Values': list(values),
         'StorageDescriptor': {
-            'Location': f"{table_location}{region}/{year}/{month}/{day}/{hour}/",
-            'InputFormat': input_format,
-            'OutputFormat': output_format,
-            'SerdeInfo': serde_info
+            'Location': f"{descriptor['Location']}{'/'.join(values)}/",
+            'InputFormat': descriptor['InputFormat'],
+            'OutputFormat': descriptor['OutputFormat'],
+            'SerdeInfo': descriptor['SerdeInfo']
         }
-    }
-    
-    for catalog_id in catalogs:
-        partitions = glue_client.get_partitions(
+    } for values in partitions]
+
+    def create(catalog_id):
+        return create_partitions(catalog_id, database, table, partition_inputs)
+    if len(catalogs) == 1:
+        results = [create(catalogs[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(catalogs)) as executor:
+            results = list(executor.map(create, catalogs))
+    LOGGER.info(
+        "Registered partitions",
+        table=table,
+        created_count=sum(created for created, _existing in results),
+        existing_count=sum(existing for _created, existing in results),
+        catalog_count=len(catalogs)
+    )
+
+def create_partitions(catalog_id, database, table, partition_inputs):
+    """
+    Create partitions in one catalog with BatchCreatePartition, counting
+    partitions that already exist as registered. Returns the created and
+    already existing counts.
+    """
+    created = 0
+    existing = 0
+    for start in range(0, len(partition_inputs), MAX_BATCH_CREATE_PARTITIONS):
+        batch = partition_inputs[start:start + MAX_BATCH_CREATE_PARTITIONS]
+        response = glue_client.batch_create_partition(
             CatalogId=catalog_id,
             DatabaseName=database,
             TableName=table,
-            Expression=f"region='{region}' and year={year} and month={month} and day={day} and hour={hour}"
+            PartitionInputList=batch
         )
-    
-                
-        if len(partitions['Partitions']) == 0:
-            create_partition_response = glue_client.create_partition(
-                CatalogId=catalog_id,
-                DatabaseName=database,
-                TableName=table,
-                PartitionInput=input_dict
-            )
\ No newline at end of file
+        failed = {}
+        for error in response.get('Errors', []):
+            if error['ErrorDetail']['ErrorCode'] == 'AlreadyExistsException':
+                existing += 1
+                continue
+            failed[tuple(error['PartitionValues'])] = error['ErrorDetail']
+        if failed:
+            detail = next(iter(failed.values()))
+            raise ClientError(
+                {'Error': {'Code': detail['ErrorCode'], 'Message': detail.get('ErrorMessage', '')}},
+                'BatchCreatePartition'
+            )
+        created += len(batch) - (len(response.get('Errors', [])))
+    return created, existing
@@ -0,0 +1,184 @@
+"""
+
+## Alarm Coalescing
+When a shared upstream dataset breaks, many related SLAs alarm together.
+Instead of publishing each to the central topic, sla_parse queues the
+payloads for a window. The window's payloads are deduplicated by
+unique_id, keeping the latest state change since SQS does not preserve
+order, and grouped by reference_id and alarm state, and each group is
+published as one digest. Payloads without a reference_id are published
+as they are.
+
+The queue is SQS when deployed, drained by the coalesce handler through
+a batching window, or a local SQLite stand-in drained inline. Coalescing
+is best-effort: concurrent SQS pollers may split one window across
+invocations, each publishing its own digest.
+
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import functools
+from typing import (
+    Dict,
+    List,
+    Tuple
+)
+
+import boto3
+import dateutil.parser
+
+NOTIFICATION_QUEUE = os.environ.get('NOTIFICATION_QUEUE', '')
+NOTIFICATION_QUEUE_URL = os.environ.get('NOTIFICATION_QUEUE_URL')
+NOTIFICATION_QUEUE_PATH = os.environ.get('NOTIFICATION_QUEUE_PATH', '/tmp/notification_queue.db')
+# Seconds notifications are held to coalesce with related alarms
+COALESCE_WINDOW_SECONDS = int(os.environ.get('COALESCE_WINDOW_SECONDS', '60'))
+
+# SendMessageBatch accepts at most 10 entries
+MAX_SEND_BATCH = 10
+
+# reference_id of SLAs without a function or dataset, never grouped
+UNKNOWN_REFERENCE_ID = 'Unknown'
+
+def severity_rank(impact) -> Tuple[int, str]:
+    """Sort key putting the most severe impact first, 'SEV 1' before 'SEV_4' before 'default'."""
+    match = re.search(r'(\d+)', str(impact))
+    return (int(match.group(1)) if match else 99, str(impact))
+
+def digest(reference_id: str, state: str, payloads: List[dict]) -> dict:
+    """One payload standing for every payload of a reference_id and state group."""
+    if len(payloads) == 1:
+        return payloads[0]
+    impact = min((payload['impact'] for payload in payloads), key=severity_rank)
+    return {
+        "details": "\n".join(f"{payload['unique_id']}: {payload['details']}" for payload in payloads),
+        "short_description": f"{len(payloads)} SLAs for {reference_id} caused by CloudWatch Alarms in {state} state",
+        "impact": impact,
+        "unique_id": f"{reference_id}-{state}-digest",
+        "alarm_origin": payloads[0]['alarm_origin'],
+        "reference_id": reference_id,
+        "alarms": payloads
+    }
+
+def coalesce(notifications: List[Tuple[str, str, str, dict]]) -> Dict[str, List[str]]:
+    """
+    Deduplicate (topic_arn, state, changed_at, payload) notifications by
+    unique_id, keeping the latest changed_at, and return one digest message
+    per topic, reference_id and state. Unknown reference_ids are not grouped.
+    """
+    latest = {}
+    for topic_arn, state, changed_at, payload in notifications:
+        key = (topic_arn, payload['unique_id'])
+        changed = dateutil.parser.parse(changed_at)
+        if key not in latest or changed >= latest[key][0]:
+            latest[key] = (changed, state, payload)
+
+    groups = {}
+    topic_messages = {}
+    for (topic_arn, _unique_id), (_changed, state, payload) in latest.items():
+        if payload['reference_id'] == UNKNOWN_REFERENCE_ID:
+            topic_messages.setdefault(topic_arn, []).append(json.dumps(payload))
+            continue
+        groups.setdefault((topic_arn, payload['reference_id'], state), []).append(payload)
+
+    for (topic_arn, reference_id, state), payloads in groups.items():
+        topic_messages.setdefault(topic_arn, []).append(json.dumps(digest(reference_id, state, payloads)))
+    return topic_messages
+
+def queue_message(topic_arn: str, state: str, changed_at: str, payload: dict) -> str:
+    """Queue message body for a notification."""
+    return json.dumps({'TopicArn': topic_arn, 'State': state, 'ChangedAt': changed_at, 'Payload': payload})
+
+def parse_queue_message(body: str) -> Tuple[str, str, str, dict]:
+    """Notification from a queue message body."""
+    message = json.loads(body)
+    return message['TopicArn'], message['State'], message['ChangedAt'], message['Payload']
+
+class SQSNotificationQueue():
+    """
+    Notifications on an SQS queue, drained by the coalesce handler's event source
+    """
+    queue_url: str
+
+    # The event source drains the queue, not the producer
+    drained_inline = False
+
+    def __init__(self, client, queue_url: str, max_attempts: int = 5) -> None:
+        self.client = client
+        self.queue_url = queue_url
+        self.max_attempts = max_attempts
+
+    def send(self, notifications: List[Tuple[str, str, str, dict]]) -> None:
+        """Queue notifications, resending only the failed entries."""
+        for start in range(0, len(notifications), MAX_SEND_BATCH):
+            pending = {
+                str(position): queue_message(*notification)
+                for position, notification in enumerate(notifications[start:start + MAX_SEND_BATCH])
+            }
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    time.sleep(0.1 * 2 ** attempt)
+                response = self.client.send_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[{'Id': entry_id, 'MessageBody': body} for entry_id, body in pending.items()]
+                )
+                pending = {failure['Id']: pending[failure['Id']] for failure in response.get('Failed', [])}
+                if not pending:
+                    break
+            if pending:
+                raise RuntimeError(f"{len(pending)} notifications failed to queue after retries")
+
+class SQLiteNotificationQueue():
+    """
+    Notifications in a local SQLite database, drained once the oldest has waited a window
+    """
+    path: str
+    window_seconds: int
+
+    drained_inline = True
+
+    def __init__(self, path: str, window_seconds: int = COALESCE_WINDOW_SECONDS) -> None:
+        self.path = path
+        self.window_seconds = window_seconds
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS notifications '
+                '(id INTEGER PRIMARY KEY AUTOINCREMENT, queued_at REAL NOT NULL, body TEXT NOT NULL)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def send(self, notifications: List[Tuple[str, str, str, dict]]) -> None:
+        """Queue notifications."""
+        now = time.time()
+        with self._connect() as connection:
+            connection.executemany(
+                'INSERT INTO notifications (queued_at, body) VALUES (?, ?)',
+                [(now, queue_message(*notification)) for notification in notifications]
+            )
+
+    def drain(self, now: float = None) -> List[Tuple[str, str, str, dict]]:
+        """Remove and return every notification once the oldest has waited the window, else none."""
+        now = time.time() if now is None else now
+        with self._connect() as connection:
+            oldest = connection.execute('SELECT MIN(queued_at) FROM notifications').fetchone()[0]
+            if oldest is None or now - oldest < self.window_seconds:
+                return []
+            rows = connection.execute('SELECT id, body FROM notifications ORDER BY id').fetchall()
+            connection.execute('DELETE FROM notifications WHERE id <= ?', (rows[-1][0],))
+        return [parse_queue_message(body) for _id, body in rows]
+
+@functools.lru_cache(maxsize=None)
+def notification_queue(queue: str = None):
+    """Return the notification queue selected by NOTIFICATION_QUEUE, or None to publish directly."""
+    queue = NOTIFICATION_QUEUE if queue is None else queue
+    if not queue:
+        return None
+    if queue == 'sqs':
+        return SQSNotificationQueue(boto3.client('sqs'), NOTIFICATION_QUEUE_URL)
+    if queue == 'sqlite':
+        return SQLiteNotificationQueue(NOTIFICATION_QUEUE_PATH)
+    raise ValueError(f"Unknown notification queue {queue}, expected one of ('', 'sqs', 'sqlite')")
@@ -0,0 +1,192 @@
+"""
+
+## Alarm Snapshot
+Change data capture for the SLA stream producer. Each alarm is reduced
+to a fingerprint of the fields that matter downstream, and the previous
+fingerprints are kept in a snapshot store. Diffing the current alarms
+against it gives the new, changed and deleted alarms.
+
+"""
+import os
+import abc
+import json
+import time
+import sqlite3
+import hashlib
+import functools
+import threading
+from typing import (
+    Dict,
+    List,
+    Tuple
+)
+
+import boto3
+
+SNAPSHOT_STORE = os.environ.get('SNAPSHOT_STORE', 'sqlite')
+SNAPSHOT_PATH = os.environ.get('SNAPSHOT_PATH', '/tmp/alarm_snapshot.db')
+SNAPSHOT_TABLE_NAME = os.environ.get('SNAPSHOT_TABLE_NAME')
+
+FINGERPRINT_FIELDS = (
+    'StateValue',
+    'StateReason',
+    'Threshold',
+    'StateUpdatedTimestamp',
+    'AlarmConfigurationUpdatedTimestamp'
+)
+
+NEW = 'NEW'
+CHANGED = 'CHANGED'
+DELETED = 'DELETED'
+SNAPSHOT = 'SNAPSHOT'
+
+def fingerprint(alarm: dict) -> str:
+    """Digest the fields of an alarm whose change is worth emitting."""
+    fields = [alarm.get(field) for field in FINGERPRINT_FIELDS]
+    return hashlib.md5(json.dumps(fields, default=str).encode('utf-8')).hexdigest()
+
+def diff_alarms(alarms: List[dict], previous: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, str], List[str]]:
+    """
+    Compare alarms against the previous fingerprints.
+
+    Returns the current fingerprints, the change type of every new or
+    changed alarm keyed by name, and the names of deleted alarms.
+    """
+    current = {}
+    changes = {}
+    for alarm in alarms:
+        name = alarm['AlarmName']
+        current[name] = fingerprint(alarm)
+        if name not in previous:
+            changes[name] = NEW
+        elif previous[name] != current[name]:
+            changes[name] = CHANGED
+    deleted = [name for name in previous if name not in current]
+    return current, changes, deleted
+
+class SnapshotStore(abc.ABC):
+    """
+    Persist the fingerprint of every alarm between invocations
+    """
+
+    @abc.abstractmethod
+    def load(self) -> Dict[str, str]:
+        """Return the stored fingerprints keyed by alarm name."""
+
+    @abc.abstractmethod
+    def update(self, changed: Dict[str, str], deleted: List[str]) -> None:
+        """Store changed fingerprints and forget deleted alarms."""
+
+class FileSnapshotStore(SnapshotStore):
+    """
+    Fingerprints in a local JSON file
+    """
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, str]:
+        try:
+            with open(self.path) as snapshot_file:
+                return json.load(snapshot_file)
+        except FileNotFoundError:
+            return {}
+
+    def update(self, changed: Dict[str, str], deleted: List[str]) -> None:
+        with self._lock:
+            snapshot = self.load()
+            snapshot.update(changed)
+            for name in deleted:
+                snapshot.pop(name, None)
+            # Replace atomically so a crash never leaves a truncated file
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w') as snapshot_file:
+                json.dump(snapshot, snapshot_file)
+            os.replace(temp_path, self.path)
+
+class SQLiteSnapshotStore(SnapshotStore):
+    """
+    Fingerprints in a local SQLite database
+    """
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS alarm_snapshot '
+                '(alarm_name TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def load(self) -> Dict[str, str]:
+        with self._connect() as connection:
+            return dict(connection.execute('SELECT alarm_name, fingerprint FROM alarm_snapshot'))
+
+    def update(self, changed: Dict[str, str], deleted: List[str]) -> None:
+        with self._connect() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO alarm_snapshot (alarm_name, fingerprint) VALUES (?, ?)',
+                changed.items()
+            )
+            connection.executemany(
+                'DELETE FROM alarm_snapshot WHERE alarm_name = ?',
+                [(name,) for name in deleted]
+            )
+
+class DynamoDBSnapshotStore(SnapshotStore):
+    """
+    Fingerprints in a DynamoDB table, one item per alarm keyed on alarm_name
+    """
+    table_name: str
+
+    # BatchWriteItem accepts at most 25 requests
+    MAX_BATCH_WRITE = 25
+
+    def __init__(self, client, table_name: str, max_attempts: int = 5) -> None:
+        self.client = client
+        self.table_name = table_name
+        self.max_attempts = max_attempts
+
+    def load(self) -> Dict[str, str]:
+        snapshot = {}
+        paginator = self.client.get_paginator('scan')
+        for page in paginator.paginate(TableName=self.table_name, ConsistentRead=True):
+            for item in page['Items']:
+                snapshot[item['alarm_name']['S']] = item['fingerprint']['S']
+        return snapshot
+
+    def update(self, changed: Dict[str, str], deleted: List[str]) -> None:
+        requests = [
+            {'PutRequest': {'Item': {'alarm_name': {'S': name}, 'fingerprint': {'S': value}}}}
+            for name, value in changed.items()
+        ] + [
+            {'DeleteRequest': {'Key': {'alarm_name': {'S': name}}}}
+            for name in deleted
+        ]
+        for start in range(0, len(requests), self.MAX_BATCH_WRITE):
+            pending = {self.table_name: requests[start:start + self.MAX_BATCH_WRITE]}
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    time.sleep(0.1 * 2 ** attempt)
+                pending = self.client.batch_write_item(RequestItems=pending).get('UnprocessedItems')
+                if not pending:
+                    break
+            if pending:
+                raise RuntimeError(f"{len(pending[self.table_name])} snapshot writes left unprocessed")
+
+@functools.lru_cache(maxsize=None)
+def snapshot_store(store: str = None) -> SnapshotStore:
+    """Return the snapshot store selected by SNAPSHOT_STORE, reused across calls."""
+    store = store or SNAPSHOT_STORE
+    if store == 'dynamodb':
+        return DynamoDBSnapshotStore(boto3.client('dynamodb'), SNAPSHOT_TABLE_NAME)
+    if store == 'sqlite':
+        return SQLiteSnapshotStore(SNAPSHOT_PATH)
+    if store == 'file':
+        return FileSnapshotStore(SNAPSHOT_PATH)
+    raise ValueError(f"Unknown snapshot store {store}, expected one of ('dynamodb', 'sqlite', 'file')")
@@ -0,0 +1,80 @@
+"""
+
+## Batching
+Helpers shared by the batched writers. Entries are packed in order into
+batches within a request's count and byte limits, and a batch's failed
+entries are resubmitted with full-jitter exponential backoff.
+
+"""
+import time
+import random
+from typing import (
+    Callable,
+    Iterable,
+    List
+)
+
+from botocore.exceptions import ClientError
+
+def pack_batches(
+    entries: Iterable,
+    size: Callable[..., int],
+    max_entries: int,
+    max_bytes: int,
+    max_entry_bytes: int,
+    entry_limit: str
+) -> List[list]:
+    """
+    Pack entries, in order, into batches within the count and byte limits,
+    raising ValueError for an entry above max_entry_bytes.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        entry_bytes = size(entry)
+        if entry_bytes > max_entry_bytes:
+            raise ValueError(f"Entry of {entry_bytes} bytes exceeds the {entry_limit} limit")
+        if batch and (len(batch) >= max_entries or batch_bytes + entry_bytes > max_bytes):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += entry_bytes
+    if batch:
+        batches.append(batch)
+    return batches
+
+def full_jitter(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff delay in seconds."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+def send_with_retries(
+    send: Callable,
+    pending,
+    batch_stats: dict,
+    throttling_error_codes: Iterable[str],
+    max_attempts: int,
+    base_delay: float,
+    max_delay: float
+):
+    """
+    Call send with the pending entries until none are left or attempts run
+    out, returning the entries still pending. send returns the entries to
+    resubmit. A throttling ClientError resubmits every pending entry, any
+    other is raised. Counts Attempts and whole-request Throttled in batch_stats.
+    """
+    for attempt in range(max_attempts):
+        if attempt:
+            time.sleep(full_jitter(attempt, base_delay, max_delay))
+        batch_stats['Attempts'] += 1
+        try:
+            pending = send(pending)
+        except ClientError as ex:
+            if ex.response.get('Error', {}).get('Code') not in throttling_error_codes:
+                raise ex
+            batch_stats['Throttled'] += len(pending)
+            continue
+        if not pending:
+            break
+    return pending
@@ -0,0 +1,123 @@
+"""
+
+## Collector
+Long-running alternative to invoking the metric stream producer once per
+minute. A scheduler loop wakes at every minute boundary and collects each
+frequency on its own thread, reusing the warm clients, connection pools,
+definitions and checkpoint store across ticks. Windows are tracked by
+the same watermarks, so a tick with nothing closed collects nothing and
+a late tick catches up.
+
+Runs for a Lambda invocation's remaining time, or indefinitely as a
+container service with `python -m lambda.collector`. With WORKER_SHARDS
+above 1 each tick coordinates its worker shards, invoked on this same
+function, or on WORKER_FUNCTION_NAME or in-process threads as a service.
+Worker and backfill events are handed to the metric stream producer.
+
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .coordinator import (
+    LambdaExecutor,
+    LocalExecutor,
+    coordinate
+)
+from .metric_stream_producer import (
+    LAMBDA_CLIENT,
+    WORKER_ASYNC,
+    WORKER_SHARDS,
+    collect,
+    main as producer_main
+)
+from .log import get_logger
+
+FREQUENCIES = ('minute', 'hour', 'day')
+
+# Seconds past each minute boundary to wait for CloudWatch to settle
+COLLECTOR_SETTLE_SECONDS = float(os.environ.get('COLLECTOR_SETTLE_SECONDS', '5'))
+# Stop early enough for in-flight collections to finish before the timeout
+COLLECTOR_DEADLINE_MARGIN_MS = int(os.environ.get('COLLECTOR_DEADLINE_MARGIN_MS', '60000'))
+
+LOGGER = get_logger(__name__)
+
+class ServiceContext():
+    """
+    Stand-in for the Lambda context when running as a container service
+    """
+    invoked_function_arn: str
+    function_name: str
+
+    def __init__(self, account: str, region: str, function_name: str = None) -> None:
+        self.invoked_function_arn = f'arn:aws:lambda:{region}:{account}:function:metric-collector'
+        self.function_name = function_name
+
+    @staticmethod
+    def from_environment() -> 'ServiceContext':
+        """Build the context from ACCOUNT_ID, AWS_REGION and the optional WORKER_FUNCTION_NAME."""
+        return ServiceContext(
+            os.environ['ACCOUNT_ID'],
+            os.environ['AWS_REGION'],
+            os.environ.get('WORKER_FUNCTION_NAME')
+        )
+
+    @staticmethod
+    def get_remaining_time_in_millis() -> float:
+        """A service never runs out of time."""
+        return float('inf')
+
+def next_tick(now: float, settle: float = COLLECTOR_SETTLE_SECONDS) -> float:
+    """Return the epoch time of the next minute boundary plus settle seconds."""
+    tick = now - now % 60 + settle
+    return tick if tick > now else tick + 60
+
+def worker_executor(context):
+    """Invoke worker shards on the context's function, or run them in-process without one."""
+    if context.function_name:
+        return LambdaExecutor(LAMBDA_CLIENT, context.function_name, asynchronous=WORKER_ASYNC)
+    return LocalExecutor(lambda event: collect(event, context), max_workers=WORKER_SHARDS)
+
+def run_collection(frequency: str, context) -> None:
+    """Collect one frequency, logging failures instead of stopping the loop."""
+    try:
+        if WORKER_SHARDS > 1:
+            coordinate({'frequency': frequency}, WORKER_SHARDS, worker_executor(context))
+        else:
+            collect({'frequency': frequency}, context)
+    except Exception as ex: # pylint: disable=broad-except
+        LOGGER.error("Collection failed", frequency=frequency, error=repr(ex))
+
+def main(
+    event: dict,
+    context: dict
+) -> None:
+    """Lambda Handler."""
+
+    # Worker shards invoked by a tick, and backfills, are single producer runs
+    if 'start_time' in event or 'shard' in event:
+        return producer_main(event, context)
+
+    frequencies = event.get('frequencies', FREQUENCIES)
+    running = {}
+    ticks = 0
+    with ThreadPoolExecutor(max_workers=len(frequencies)) as executor:
+        while context.get_remaining_time_in_millis() > COLLECTOR_DEADLINE_MARGIN_MS:
+            for frequency in frequencies:
+                # A slow collection is not stacked, its next run catches up
+                if frequency in running and not running[frequency].done():
+                    LOGGER.warning("Collection still running, skipping tick", frequency=frequency)
+                    continue
+                running[frequency] = executor.submit(run_collection, frequency, context)
+            ticks += 1
+
+            now = time.time()
+            wait = next_tick(now) - now
+            remaining = (context.get_remaining_time_in_millis() - COLLECTOR_DEADLINE_MARGIN_MS) / 1000
+            if wait >= remaining:
+                break
+            time.sleep(wait)
+    LOGGER.info("Collector stopped", ticks=ticks)
+
+if __name__ == '__main__':
+    main({}, ServiceContext.from_environment())
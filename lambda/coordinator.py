@@ -0,0 +1,117 @@
+"""
+
+## Coordinator
+Fan a frequency's collection out across worker invocations. Metrics are
+assigned to stable shards by the digest of their query Id, so a metric
+stays on one worker, and under one watermark, across invocations. Each
+worker collects its shard and the coordinator aggregates their stats.
+
+"""
+import json
+import time
+from typing import (
+    Callable,
+    List
+)
+from concurrent.futures import ThreadPoolExecutor
+
+from .log import get_logger
+
+LOGGER = get_logger(__name__)
+
+class WorkerError(Exception):
+    """Raised by an executor when a worker invocation fails."""
+
+def run_events(function: Callable[[dict], dict], events: List[dict], max_workers: int) -> List:
+    """Call function on every event concurrently, returning its result or the raised error."""
+    def call(event):
+        try:
+            return function(event)
+        except Exception as ex: # pylint: disable=broad-except
+            return ex
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(events)))) as executor:
+        return list(executor.map(call, events))
+
+class LocalExecutor():
+    """
+    Run workers in-process on a thread pool, a stand-in for Lambda workers
+    """
+
+    def __init__(self, worker: Callable[[dict], dict], max_workers: int = 8) -> None:
+        self.worker = worker
+        self.max_workers = max_workers
+
+    def run(self, events: List[dict]) -> List:
+        """Run every worker event, returning its stats or the raised error."""
+        return run_events(self.worker, events, self.max_workers)
+
+class LambdaExecutor():
+    """
+    Invoke a Lambda function once per worker event
+    """
+    function_name: str
+    asynchronous: bool
+
+    def __init__(self, client, function_name: str, asynchronous: bool = False) -> None:
+        self.client = client
+        self.function_name = function_name
+        self.asynchronous = asynchronous
+
+    def invoke(self, event: dict):
+        """Invoke one worker, returning its stats, or None when asynchronous."""
+        response = self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='Event' if self.asynchronous else 'RequestResponse',
+            Payload=json.dumps(event).encode('utf-8')
+        )
+        if self.asynchronous:
+            return None
+        payload = json.loads(response['Payload'].read() or 'null')
+        if 'FunctionError' in response:
+            raise WorkerError(f"Worker {event.get('shard')} failed: {payload}")
+        return payload
+
+    def run(self, events: List[dict]) -> List:
+        """Invoke every worker concurrently, returning its stats or the raised error."""
+        return run_events(self.invoke, events, len(events))
+
+def aggregate_stats(frequency: str, results: List) -> dict:
+    """Sum worker stats into one health summary for the frequency."""
+    health = {
+        'Frequency': frequency,
+        'Shards': len(results),
+        'Succeeded': 0,
+        'Failed': 0,
+        'Dispatched': 0,
+        'QueryCount': 0,
+        'ResultCount': 0,
+        'RecordCount': 0,
+        'Errors': []
+    }
+    for shard, result in enumerate(results):
+        if isinstance(result, Exception):
+            health['Failed'] += 1
+            health['Errors'].append({'Shard': shard, 'Error': repr(result)})
+        elif result is None:
+            # Asynchronous workers report through their own logs
+            health['Dispatched'] += 1
+        else:
+            health['Succeeded'] += 1
+            for key in ('QueryCount', 'ResultCount', 'RecordCount'):
+                health[key] += result.get(key, 0)
+    return health
+
+def coordinate(event: dict, shard_count: int, executor) -> dict:
+    """Run one worker per shard for event['frequency'] and aggregate their stats."""
+    start = time.perf_counter()
+    events = [
+        dict(event, shard=shard, shard_count=shard_count)
+        for shard in range(shard_count)
+    ]
+    health = aggregate_stats(event['frequency'], executor.run(events))
+    health['DurationMs'] = round((time.perf_counter() - start) * 1000, 2)
+    if health['Failed']:
+        LOGGER.error("Worker shards failed", **health)
+    else:
+        LOGGER.info("Worker shards completed", **health)
+    return health
@@ -0,0 +1,141 @@
+"""
+
+## Kinesis Writer
+Shared batched PutRecords writer for the stream producers. Records are
+packed by count and byte size, only failed entries are resubmitted and
+batches are pipelined on a bounded thread pool.
+
+"""
+import time
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+
+from .batching import pack_batches, send_with_retries
+
+# PutRecords service limits
+MAX_RECORDS_PER_REQUEST = 500
+MAX_BYTES_PER_REQUEST = 5 * 1024 * 1024
+MAX_BYTES_PER_RECORD = 1024 * 1024
+
+THROTTLING_ERROR_CODES = (
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'LimitExceededException'
+)
+
+class KinesisWriteError(Exception):
+    """Raised when records are still failing after every retry."""
+
+    def __init__(self, failed_records: List[dict], stats: dict) -> None:
+        super().__init__(f"{len(failed_records)} records failed to put after retries")
+        self.failed_records = failed_records
+        self.stats = stats
+
+def record_size(record: dict) -> int:
+    """Return the bytes a record counts against the PutRecords limits."""
+    data = record['Data']
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return len(data) + len(record['PartitionKey'].encode('utf-8'))
+
+def pack_records(
+    records: List[dict],
+    max_records: int = MAX_RECORDS_PER_REQUEST,
+    max_bytes: int = MAX_BYTES_PER_REQUEST
+) -> List[List[dict]]:
+    """Pack records, in order, into batches within the count and byte limits."""
+    return pack_batches(records, record_size, max_records, max_bytes, MAX_BYTES_PER_RECORD, '1 MiB Kinesis record')
+
+class KinesisBatchWriter():
+    """
+    Put records to a Kinesis stream in size-aware batches
+    """
+    stream_name: str
+    max_attempts: int
+    max_workers: int
+
+    def __init__(
+        self,
+        client,
+        stream_name: str,
+        max_records: int = MAX_RECORDS_PER_REQUEST,
+        max_bytes: int = MAX_BYTES_PER_REQUEST,
+        max_attempts: int = 5,
+        base_delay: float = 0.1,
+        max_delay: float = 5.0,
+        max_workers: int = 4
+    ) -> None:
+        self.client = client
+        self.stream_name = stream_name
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_workers = max_workers
+
+    def put_records(self, records: List[dict]) -> dict:
+        """Put every record, raising KinesisWriteError if any are left failing."""
+        batches = pack_records(records, self.max_records, self.max_bytes)
+        stats = {
+            'RecordCount': len(records),
+            'FailedRecordCount': 0,
+            'ThrottledCount': 0,
+            'Batches': []
+        }
+        if not batches:
+            return stats
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(batches)))) as executor:
+            results = list(executor.map(self.put_batch, batches))
+
+        failed_records = []
+        for batch_stats, batch_failed in results:
+            stats['Batches'].append(batch_stats)
+            stats['ThrottledCount'] += batch_stats['Throttled']
+            failed_records += batch_failed
+        stats['FailedRecordCount'] = len(failed_records)
+
+        if failed_records:
+            raise KinesisWriteError(failed_records, stats)
+        return stats
+
+    def put_batch(self, batch: List[dict]):
+        """Put one batch, resubmitting only the failed entries."""
+        start = time.perf_counter()
+        batch_stats = {
+            'Records': len(batch),
+            'Bytes': sum(record_size(record) for record in batch),
+            'Attempts': 0,
+            'Throttled': 0,
+            'LatencyMs': 0.0
+        }
+
+        def send(pending: List[dict]) -> List[dict]:
+            response = self.client.put_records(
+                Records=pending,
+                StreamName=self.stream_name
+            )
+            if not response.get('FailedRecordCount'):
+                return []
+            retry = []
+            for record, result in zip(pending, response['Records']):
+                if 'ErrorCode' not in result:
+                    continue
+                if result['ErrorCode'] == 'ProvisionedThroughputExceededException':
+                    batch_stats['Throttled'] += 1
+                retry.append(record)
+            return retry
+
+        pending = send_with_retries(
+            send,
+            batch,
+            batch_stats,
+            THROTTLING_ERROR_CODES,
+            self.max_attempts,
+            self.base_delay,
+            self.max_delay
+        )
+        batch_stats['Failed'] = len(pending)
+        batch_stats['LatencyMs'] = round((time.perf_counter() - start) * 1000, 2)
+        return batch_stats, pending
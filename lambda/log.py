@@ -0,0 +1,78 @@
+"""
+
+## Log
+Structured logging shared by the Lambdas. Every line is a JSON object
+with a level, logger name, message and fields. Payloads are serialized
+only when their level is enabled: full dumps need LOG_LEVEL=DEBUG, and
+per-record lines are sampled at LOG_SAMPLE_RATE.
+
+"""
+import os
+import json
+import random
+import logging
+from typing import Iterable
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+
+if not logging.getLogger().handlers:
+    logging.basicConfig(format='%(message)s')
+
+class StructuredLogger():
+    """
+    Emit JSON log lines with levels, sampling and debug-only dumps
+    """
+    name: str
+    sample_rate: float
+
+    def __init__(self, name: str, level: str = LOG_LEVEL, sample_rate: float = LOG_SAMPLE_RATE) -> None:
+        self.name = name
+        self.sample_rate = sample_rate
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level)
+
+    def log(self, level: int, message: str, **fields) -> None:
+        """Log message with fields at level, serializing only if enabled."""
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(level, json.dumps({
+            'level': logging.getLevelName(level),
+            'logger': self.name,
+            'message': message,
+            **fields
+        }, default=str))
+
+    def debug(self, message: str, **fields) -> None:
+        self.log(logging.DEBUG, message, **fields)
+
+    def info(self, message: str, **fields) -> None:
+        self.log(logging.INFO, message, **fields)
+
+    def warning(self, message: str, **fields) -> None:
+        self.log(logging.WARNING, message, **fields)
+
+    def error(self, message: str, **fields) -> None:
+        self.log(logging.ERROR, message, **fields)
+
+    def dump(self, message: str, payload) -> None:
+        """Log a full payload, only at DEBUG level."""
+        self.log(logging.DEBUG, message, payload=payload)
+
+    def sample(self, message: str, items: Iterable, rate: float = None) -> None:
+        """Log each item at INFO with probability rate, or every item at DEBUG."""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            rate = 1.0
+        elif not self.logger.isEnabledFor(logging.INFO):
+            return
+        else:
+            rate = self.sample_rate if rate is None else rate
+        if rate <= 0:
+            return
+        for item in items:
+            if rate >= 1 or random.random() < rate:
+                self.info(message, item=item, sampled=rate < 1)
+
+def get_logger(name: str) -> StructuredLogger:
+    """Return a structured logger for a Lambda module."""
+    return StructuredLogger(name)
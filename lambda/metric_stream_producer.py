@@ -2,25 +2,87 @@
 
 ## Stream Producer
 Lambda function that will query all metrics for a given namespace
-and send metric data for the last 60 seconds to a kinesis stream
+and send metric data for every frequency-aligned window closed since
+the last collection to a kinesis stream
 
 """
 import os
 import json
-from typing import List
+from typing import (
+    List,
+    Tuple
+)
 from datetime import timedelta, datetime, timezone
 import dateutil.parser
 from enum import Enum
-import itertools
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
-from dataquality.stream import MetricStream
+from dataquality.metric import ExpressionMetric
 from definitions.definition import Definition
+from .query_planner import (
+    QueryPlan,
+    plan_queries,
+    query_period,
+    shard_queries,
+    slice_seconds,
+    split_wide_queries,
+    time_slices
+)
+from .coordinator import LambdaExecutor, coordinate
+from .rate_limit import RateLimiter
+from .kinesis_writer import KinesisBatchWriter
+from .partitioning import partition_key
+from .record_aggregation import aggregate_records, compact_json
+from .log import get_logger
+from .windowing import align, checkpoint_store, pending_windows
 
-CW_CLIENT = boto3.client('cloudwatch')
+# Bounded pool for concurrent GetMetricData requests sharing one client
+GET_METRIC_DATA_WORKERS = int(os.environ.get('GET_METRIC_DATA_WORKERS', '8'))
+# Above 1, each invocation coordinates this many worker shards
+WORKER_SHARDS = int(os.environ.get('WORKER_SHARDS', '1'))
+# Fire-and-forget workers, their stats then stay in their own logs
+WORKER_ASYNC = os.environ.get('WORKER_ASYNC', 'false').lower() == 'true'
+
+CW_CLIENT = boto3.client(
+    'cloudwatch',
+    config=Config(max_pool_connections=GET_METRIC_DATA_WORKERS)
+)
 KINESIS_CLIENT = boto3.client('kinesis')
+# Workers are invoked synchronously and may run up to the Lambda timeout, one
+# connection per worker for each of the three frequencies the collector may
+# coordinate at once
+LAMBDA_CLIENT = boto3.client(
+    'lambda',
+    config=Config(
+        read_timeout=900,
+        retries={'max_attempts': 0},
+        max_pool_connections=max(10, WORKER_SHARDS * 3)
+    )
+)
+LOGGER = get_logger(__name__)
+
+DATAPOINT_RECORDS = 'datapoint'
+SERIES_RECORDS = 'series'
+RECORD_MODES = (DATAPOINT_RECORDS, SERIES_RECORDS)
+RECORD_MODE = os.environ.get('RECORD_MODE', DATAPOINT_RECORDS)
+
+JSON_ENCODING = 'json'
+AGGREGATED_ENCODING = 'aggregated'
+RECORD_ENCODINGS = (JSON_ENCODING, AGGREGATED_ENCODING)
+RECORD_ENCODING = os.environ.get('RECORD_ENCODING', JSON_ENCODING)
+# Aggregated records are packed per shard of an evenly split stream, 0 reads
+# each stream's open shard count once per container
+AGGREGATION_SHARD_COUNT = int(os.environ.get('AGGREGATION_SHARD_COUNT', '0'))
+
+# Shared GetMetricData budget for backfill, below the default 50 TPS quota
+GET_METRIC_DATA_TPS = float(os.environ.get('GET_METRIC_DATA_TPS', '25'))
+# Stop a backfill early enough to checkpoint before the Lambda timeout
+BACKFILL_DEADLINE_MARGIN_MS = int(os.environ.get('BACKFILL_DEADLINE_MARGIN_MS', '60000'))
 
 class StreamName(Enum):
     KINESIS_MINUTE_STREAM_NAME: str = 'minute'
@@ -33,122 +95,399 @@ def main(
 ) -> None:
     """Lambda Handler."""
 
-    account_number = context.invoked_function_arn.split(":")[4]
-    definition = Definition(account=account_number)
-    dataset_stream = MetricStream(metric_sets=definition.metric_sets)
+    if 'start_time' in event:
+        return backfill(event, context)
+    shard_count = int(event.get('shard_count', WORKER_SHARDS))
+    if shard_count > 1 and 'shard' not in event:
+        return coordinate(
+            event=event,
+            shard_count=shard_count,
+            executor=LambdaExecutor(LAMBDA_CLIENT, context.function_name, asynchronous=WORKER_ASYNC)
+        )
+    return collect(event, context)
 
-    end_time_exact = datetime.utcnow()
-    end_time = end_time_exact - timedelta(minutes=end_time_exact.minute % 10,
-        seconds=end_time_exact.second,
-        microseconds=end_time_exact.microsecond)
+def collect(
+    event: dict,
+    context: dict
+) -> dict:
+    """
+    Collect every closed window of event['frequency'] not yet emitted.
 
+    A worker event also carries shard and shard_count, and collects only
+    that shard's metrics under its own watermark.
+    """
+
+    account_number = context.invoked_function_arn.split(":")[4]
+    definition = Definition.cached(account=account_number)
+    dataset_stream = definition.metric_stream
+
+    frequency = event['frequency']
     md_queries = dataset_stream.metric_data_queries(
-            frequency=event['frequency']
+            frequency=frequency
         )
+    watermark_key = frequency
+    if 'shard' in event:
+        md_queries = shard_queries(md_queries, int(event['shard']), int(event['shard_count']))
+        watermark_key = f"{frequency}#{event['shard']}/{event['shard_count']}"
 
+    stats = {
+        'Frequency': frequency,
+        'Shard': event.get('shard'),
+        'QueryCount': len(md_queries),
+        'WindowCount': 0,
+        'ResultCount': 0,
+        'RecordCount': 0
+    }
     if len(md_queries) <= 0:
-        print(f"No metrics matched for {event['frequency']} frequency.")
-        return False
+        LOGGER.info("No metrics matched", frequency=frequency, shard=event.get('shard'))
+        return stats
     else:
-        print("Matched metrics:")
-        print(md_queries)
-
-        # Group metrics by Period
-        grouped_dict = {}
-        for i in md_queries:
-            k = i["MetricStat"]["Period"]
-            if (grouped_dict.get(k) == None):
-                grouped_dict[k]=[i]
-            else:
-                grouped_dict[k].append(i)
-
-    # For each Period in grouped_dict get metric data and append to metrics_data list
-    metrics_data = []
-
-    for period, md in grouped_dict.items():
-        start_time = end_time - timedelta(seconds=period)
-        period_metrics_data = get_metric_data(
-            metric_data_queries=md,
+        LOGGER.info("Matched metrics", frequency=frequency, query_count=len(md_queries))
+        LOGGER.dump("Matched metric queries", md_queries)
+
+        # Pack queries of every Period into the fewest API-legal calls
+        query_plan = plan_queries(md_queries)
+
+    fetch_plans = plan_fetches(md_queries, frequency_to_period(frequency))
+
+    # Collect every window closed since the last emitted one
+    store = checkpoint_store()
+    windows = pending_windows(
+        now=datetime.utcnow(),
+        period=frequency_to_period(frequency),
+        watermark=store.get_watermark(watermark_key)
+    )
+    stats['WindowCount'] = len(windows)
+    if not windows:
+        LOGGER.info("No closed windows since the last collection", frequency=frequency)
+        return stats
+
+    # Closed windows are contiguous, fetch them in as few calls as the
+    # datapoint limit allows
+    slices = time_slices(
+        windows[0][0],
+        windows[-1][1],
+        slice_seconds(query_plan, frequency_to_period(frequency))
+    )
+    LOGGER.info(
+        "Query plan",
+        frequency=frequency,
+        slice_count=len(slices),
+        **query_plan.describe(int((slices[0][1] - slices[0][0]).total_seconds()))
+    )
+    for start_time, end_time in slices:
+        # Fetch every call concurrently and merge into metrics_data list
+        metrics_data = []
+        for fetch_plan, period in fetch_plans:
+            metrics_data += fetch_metric_data(
+                query_plan=fetch_plan,
+                end_time=end_time,
+                start_time=min(start_time, end_time - timedelta(seconds=period))
+            )
+        LOGGER.info(
+            "Fetched metric data",
+            frequency=frequency,
             start_time=start_time,
-            end_time=end_time
+            end_time=end_time,
+            result_count=len(metrics_data)
         )
-        for metric_object in period_metrics_data:
-            metrics_data.append(metric_object)
-            print(metric_object)
+        LOGGER.sample("Metric data result", metrics_data)
 
-    put_metrics(
-        metrics_data=metrics_data,
-        time=end_time,
-        event=event,
-        context=context,
-        metric_sets=dataset_stream.metrics
+        stats['ResultCount'] += len(metrics_data)
+        stats['RecordCount'] += put_metrics(
+            metrics_data=metrics_data,
+            time=end_time,
+            event=event,
+            context=context,
+            metric_sets=dataset_stream.metrics,
+            metric_index=dataset_stream.metric_index()
+        )['RecordCount']
+        # Advance only once the slice's records are in the stream
+        if not store.set_watermark(watermark_key, end_time):
+            # An overlapping invocation already emitted past this slice
+            LOGGER.warning(
+                "Watermark already advanced, stopping",
+                frequency=frequency,
+                watermark_key=watermark_key,
+                end_time=end_time
+            )
+            break
+    return stats
+
+def plan_fetches(md_queries: List[dict], period: int) -> List[Tuple[QueryPlan, int]]:
+    """
+    Plan the queries fitting a window of period seconds together, and each
+    wider Period apart with that Period, to be fetched over its whole
+    Period ending at the window end, never as a partial aggregate.
+    """
+    narrow_queries, wide_queries = split_wide_queries(md_queries, period)
+    fetch_plans = [(plan_queries(narrow_queries), 0)] if narrow_queries else []
+    fetch_plans += [(plan_queries(queries), wide_period) for wide_period, queries in sorted(wide_queries.items())]
+    return fetch_plans
+
+def backfill(
+    event: dict,
+    context: dict
+) -> dict:
+    """
+    Re-collect a time range for one frequency.
+
+    The event carries frequency, start_time and end_time. Progress is
+    checkpointed after every slice, so invoking again with the same event
+    resumes after the last emitted slice.
+    """
+
+    account_number = context.invoked_function_arn.split(":")[4]
+    definition = Definition.cached(account=account_number)
+    dataset_stream = definition.metric_stream
+
+    frequency = event['frequency']
+    period = frequency_to_period(frequency)
+    start_time = align(dateutil.parser.parse(event['start_time']), period)
+    end_time = align(dateutil.parser.parse(event['end_time']), period)
+    backfill_id = event.get('backfill_id') or f'backfill:{frequency}:{start_time.isoformat()}:{end_time.isoformat()}'
+
+    md_queries = dataset_stream.metric_data_queries(frequency=frequency)
+    if len(md_queries) <= 0:
+        LOGGER.info("No metrics matched", frequency=frequency)
+        return {
+            'BackfillId': backfill_id,
+            'SlicesCompleted': 0,
+            'SlicesRemaining': 0,
+            'DatapointCount': 0,
+            'Complete': True
+        }
+    query_plan = plan_queries(md_queries)
+    fetch_plans = plan_fetches(md_queries, period)
+
+    store = checkpoint_store()
+    watermark = store.get_watermark(backfill_id)
+    if watermark is not None:
+        start_time = max(start_time, watermark)
+
+    slices = time_slices(start_time, end_time, slice_seconds(query_plan, period))
+    LOGGER.info(
+        "Backfilling",
+        frequency=frequency,
+        start_time=start_time,
+        end_time=end_time,
+        slice_count=len(slices)
     )
 
-def get_metric_data(metric_data_queries, start_time, end_time):
+    rate_limiter = RateLimiter(GET_METRIC_DATA_TPS)
+    datapoint_count = 0
+    completed = 0
+    with ThreadPoolExecutor(max_workers=GET_METRIC_DATA_WORKERS) as executor:
+        # Fetch a pool's worth of slices at a time, emit them in order
+        for wave in range(0, len(slices), GET_METRIC_DATA_WORKERS):
+            if context.get_remaining_time_in_millis() < BACKFILL_DEADLINE_MARGIN_MS:
+                break
+            wave_futures = [
+                (slice_end, [
+                    executor.submit(
+                        get_metric_data,
+                        metric_data_queries=call,
+                        start_time=min(slice_start, slice_end - timedelta(seconds=wide_period)),
+                        end_time=slice_end,
+                        rate_limiter=rate_limiter
+                    )
+                    for fetch_plan, wide_period in fetch_plans
+                    for call in fetch_plan.calls
+                ])
+                for slice_start, slice_end in slices[wave:wave + GET_METRIC_DATA_WORKERS]
+            ]
+            for slice_end, futures in wave_futures:
+                metrics_data = []
+                for future in futures:
+                    metrics_data += future.result()
+                # Count before translation pops the datapoint arrays
+                datapoint_count += sum(len(metric_object['Values']) for metric_object in metrics_data)
+                if metrics_data:
+                    put_metrics(
+                        metrics_data=metrics_data,
+                        time=slice_end,
+                        event=event,
+                        context=context,
+                        metric_sets=dataset_stream.metrics,
+                        metric_index=dataset_stream.metric_index()
+                    )
+                store.set_watermark(backfill_id, slice_end)
+                completed += 1
+
+    progress = {
+        'BackfillId': backfill_id,
+        'SlicesCompleted': completed,
+        'SlicesRemaining': len(slices) - completed,
+        'DatapointCount': datapoint_count,
+        'Complete': completed == len(slices)
+    }
+    LOGGER.info("Backfill progress", **progress)
+    return progress
+
+def fetch_metric_data(
+    query_plan: QueryPlan,
+    end_time: datetime,
+    start_time: datetime = None,
+    max_workers: int = GET_METRIC_DATA_WORKERS
+) -> List[dict]:
+    """
+    Fetch all calls of a query plan on a bounded thread pool.
+
+    Without a start_time every call covers the widest Period before end_time.
+    """
+    if start_time is None:
+        widest = max(query_period(query) for call in query_plan.calls for query in call)
+        start_time = end_time - timedelta(seconds=widest)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(query_plan.calls)))) as executor:
+        futures = [
+            executor.submit(
+                get_metric_data,
+                metric_data_queries=call,
+                start_time=start_time,
+                end_time=end_time
+            )
+            for call in query_plan.calls
+        ]
+        # Results are merged in plan order regardless of completion order
+        metrics_data = []
+        for future in futures:
+            metrics_data += future.result()
+    return metrics_data
+
+def get_metric_data(metric_data_queries, start_time, end_time, rate_limiter: RateLimiter = None):
     """Paginate and return all metric data under namspace."""
     metric_data_results = []
-    paginator = CW_CLIENT.get_paginator('get_metric_data')
-    page_iterator = paginator.paginate(
-        MetricDataQueries=metric_data_queries,
-        StartTime=start_time,
-        EndTime=end_time
-    )
-    for page in page_iterator:
+    kwargs = {
+        'MetricDataQueries': metric_data_queries,
+        'StartTime': start_time,
+        'EndTime': end_time
+    }
+    while True:
+        # Every page is a separate call against the TPS quota
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        page = CW_CLIENT.get_metric_data(**kwargs)
         metric_data_results += page['MetricDataResults']
+        if not page.get('NextToken'):
+            break
+        kwargs['NextToken'] = page['NextToken']
     return metric_data_results
 
-def translate_metrics_to_records(metrics_data: List[dict], time: datetime, event: dict, context: dict, metric_sets):
-    """Translate CW metrics list to Kinesis stream records."""
+def translate_metrics_to_records(metrics_data: List[dict], time: datetime, event: dict, context: dict, metric_sets, metric_index: dict = None, record_mode: str = None, record_encoding: str = None):
+    """
+    Translate CW metrics list to Kinesis stream records.
+
+    In datapoint mode every datapoint is its own record carrying MetricTimestamp
+    and MetricValue. In series mode each result is one record carrying its
+    Timestamps and Values arrays. The aggregated encoding serializes each
+    record as compact JSON, ready for aggregate_records.
+    """
     records = []
-    metadata_map = {}
-    dimensions_map = {}
+    if metric_index is None:
+        metric_index = {metric.unique_id(): metric for metric in metric_sets}
+    record_mode = record_mode or RECORD_MODE
+    if record_mode not in RECORD_MODES:
+        raise ValueError(f"Unknown record mode {record_mode}, expected one of {RECORD_MODES}")
+    record_encoding = record_encoding or RECORD_ENCODING
+    if record_encoding not in RECORD_ENCODINGS:
+        raise ValueError(f"Unknown record encoding {record_encoding}, expected one of {RECORD_ENCODINGS}")
+    if record_encoding == AGGREGATED_ENCODING:
+        serialize = compact_json
+    else:
+        serialize = functools.partial(json.dumps, default=str)
+
+    collection_time = time.replace(tzinfo=timezone.utc).isoformat()
+    account_id = context.invoked_function_arn.split(":")[4]
+    region = context.invoked_function_arn.split(":")[3]
 
     for metric_object in metrics_data:
-        for metric in metric_sets:
-            if metric.unique_id() == metric_object['Id']:
-                metric_object['Namespace'] = metric.namespace
-                metric_object['Name'] = metric.name
-                metric_object['Period'] = metric.period
-                metric_object['Statistic'] = metric.statistic
-                if metric.metadata:
-                    for meta in metric.metadata:
-                        metadata_map[meta.name] = meta.value
-                    metric_object['Metadata'] = metadata_map
-                if metric.dimensions:
-                    for dimension in metric.dimensions:
-                        dimensions_map[dimension.name] = dimension.value
-                    metric_object['Dimensions'] = dimensions_map
-            else:
-                continue
-
-        metric_object['CollectionTime'] = time.replace(tzinfo=timezone.utc).isoformat()
-        metric_object['AccountId'] = context.invoked_function_arn.split(":")[4]
-        metric_object['Region'] = context.invoked_function_arn.split(":")[3]
-        metric_object['MetricTimestamp'] = metric_object['Timestamps'][0] if len(metric_object['Timestamps']) > 0 else None
-        metric_object['MetricValue'] = metric_object['Values'][0] if len(metric_object['Values']) > 0 else None
+        metric = metric_index.get(metric_object['Id'])
+        series_id = metric_object['Id']
+        if metric is not None:
+            metric_object['Namespace'] = metric.namespace
+            metric_object['Name'] = metric.name
+            metric_object['Period'] = metric.period
+            metric_object['Statistic'] = metric.statistic
+            if metric.metadata:
+                metric_object['Metadata'] = {meta.name: meta.value for meta in metric.metadata}
+            if metric.dimensions:
+                metric_object['Dimensions'] = {
+                    dimension.name: dimension.value for dimension in metric.dimensions
+                }
+            if isinstance(metric, ExpressionMetric):
+                # Every series of a SEARCH shares the query Id, the Label tells them apart
+                series_id = f"{metric_object['Id']}:{metric_object.get('Label')}"
+                if metric.label_dimension:
+                    metric_object.setdefault('Dimensions', {})[metric.label_dimension] = metric_object.get('Label')
+
+        metric_object['CollectionTime'] = collection_time
+        metric_object['AccountId'] = account_id
+        metric_object['Region'] = region
         metric_object['Frequency'] = event['frequency']
-        records.append({
-            'Data': json.dumps(metric_object, default=str),
-            'PartitionKey': 'default'
-        })
-    print(records)
+        key = partition_key(
+            series_id=series_id,
+            namespace=metric_object.get('Namespace'),
+            account=account_id
+        )
+
+        if record_mode == SERIES_RECORDS:
+            records.append({
+                'Data': serialize(metric_object),
+                'PartitionKey': key
+            })
+            continue
+
+        timestamps = metric_object.pop('Timestamps')
+        values = metric_object.pop('Values')
+        # A series without datapoints still yields one record, as before
+        for timestamp, value in zip(timestamps, values) if values else [(None, None)]:
+            metric_object['MetricTimestamp'] = timestamp
+            metric_object['MetricValue'] = value
+            records.append({
+                'Data': serialize(metric_object),
+                'PartitionKey': key
+            })
+    LOGGER.dump("Metric records", records)
     return records
 
-def put_metrics(metrics_data: List[dict], time: datetime, event: dict, context: dict, metric_sets):
+@functools.lru_cache(maxsize=None)
+def stream_shard_count(stream_name: str) -> int:
+    """Return AGGREGATION_SHARD_COUNT, or the stream's open shard count read once per container."""
+    if AGGREGATION_SHARD_COUNT:
+        return AGGREGATION_SHARD_COUNT
+    summary = KINESIS_CLIENT.describe_stream_summary(StreamName=stream_name)['StreamDescriptionSummary']
+    return summary['OpenShardCount']
+
+def put_metrics(metrics_data: List[dict], time: datetime, event: dict, context: dict, metric_sets, metric_index: dict = None):
     """Put records to kinesis stream"""
+    stream_name = os.environ[StreamName(event['frequency']).name]
+    writer = KinesisBatchWriter(
+        client=KINESIS_CLIENT,
+        stream_name=stream_name
+    )
+    records = translate_metrics_to_records(
+        metrics_data=metrics_data,
+        time=time,
+        event=event,
+        context=context,
+        metric_sets=metric_sets,
+        metric_index=metric_index
+    )
+    if RECORD_ENCODING == AGGREGATED_ENCODING:
+        records = aggregate_records(records, shard_count=stream_shard_count(stream_name))
     try:
-        KINESIS_CLIENT.put_records(
-            Records=translate_metrics_to_records(
-                metrics_data=metrics_data,
-                time=time,
-                event=event,
-                context=context,
-                metric_sets=metric_sets
-            ),
-            StreamName=os.environ[StreamName(event['frequency']).name]
-        )
+        stats = writer.put_records(records)
     except ClientError as ex:
         raise ex
+    LOGGER.info(
+        "Put metric records",
+        record_count=stats['RecordCount'],
+        batch_count=len(stats['Batches']),
+        throttled_count=stats['ThrottledCount']
+    )
+    LOGGER.dump("Metric record batches", stats['Batches'])
+    return stats
 
 def frequency_to_period(frequency: str) -> int:
     """ Convert rate string to period in seconds."""
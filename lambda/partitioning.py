@@ -0,0 +1,63 @@
+"""
+
+## Partitioning
+Partition key strategies for the stream producers. Kinesis maps the MD5
+of the partition key onto shard hash key ranges, so every strategy keeps
+a given series on one shard while spreading distinct series across the
+stream. Placement does not imply ordering: the batch writer puts batches
+concurrently and resubmits failed entries, so records of a series may
+arrive out of order and consumers should order by their timestamps.
+
+"""
+import os
+import hashlib
+from typing import (
+    Dict,
+    Iterable
+)
+
+SERIES = 'series'
+NAMESPACE = 'namespace'
+ACCOUNT = 'account'
+CONSTANT = 'constant'
+
+STRATEGIES = (SERIES, NAMESPACE, ACCOUNT, CONSTANT)
+
+PARTITION_KEY_STRATEGY = os.environ.get('PARTITION_KEY_STRATEGY', SERIES)
+
+# Kinesis hash keys are 128 bit integers
+MAX_HASH_KEY = 2 ** 128 - 1
+
+def partition_key(
+    series_id: str,
+    namespace: str = None,
+    account: str = None,
+    strategy: str = None
+) -> str:
+    """Return the partition key for a record under the given strategy."""
+    strategy = strategy or PARTITION_KEY_STRATEGY
+    if strategy == SERIES:
+        source = series_id
+    elif strategy == NAMESPACE:
+        source = namespace
+    elif strategy == ACCOUNT:
+        source = account
+    elif strategy == CONSTANT:
+        return 'default'
+    else:
+        raise ValueError(f"Unknown partition key strategy {strategy}, expected one of {STRATEGIES}")
+
+    # Digest keeps the key within the 256 character limit for long ids
+    return hashlib.md5(str(source).encode('utf-8')).hexdigest()
+
+def shard_for_key(key: str, shard_count: int) -> int:
+    """Return the shard a key lands on for a stream of evenly split shards."""
+    hash_key = int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16)
+    return hash_key * shard_count // (MAX_HASH_KEY + 1)
+
+def shard_distribution(keys: Iterable[str], shard_count: int) -> Dict[int, int]:
+    """Count how many keys land on each of shard_count evenly split shards."""
+    distribution = {shard: 0 for shard in range(shard_count)}
+    for key in keys:
+        distribution[shard_for_key(key, shard_count)] += 1
+    return distribution
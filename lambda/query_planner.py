@@ -0,0 +1,147 @@
+"""
+
+## Query Planner
+Split MetricDataQueries, and the time range they cover, into requests
+that GetMetricData accepts
+
+"""
+import hashlib
+from typing import (
+    Dict,
+    List,
+    Tuple
+)
+from datetime import datetime, timedelta
+
+# GetMetricData rejects requests with more than 500 MetricDataQueries
+MAX_QUERIES_PER_REQUEST = 500
+
+# and returns at most 100,800 datapoints per request
+MAX_DATAPOINTS_PER_REQUEST = 100800
+
+def query_period(query: dict) -> int:
+    """Return the Period of a MetricStat or expression query."""
+    if 'MetricStat' in query:
+        return query['MetricStat']['Period']
+    return query['Period']
+
+def query_shard(query: dict, shard_count: int) -> int:
+    """Return the stable shard of a query, from the digest of its Id."""
+    return int(hashlib.md5(query['Id'].encode('utf-8')).hexdigest(), 16) % shard_count
+
+def shard_queries(metric_data_queries: List[dict], shard: int, shard_count: int) -> List[dict]:
+    """Return the queries assigned to shard out of shard_count."""
+    if not 0 <= shard < shard_count:
+        raise ValueError(f"shard must be in [0, {shard_count}), got {shard}")
+    return [query for query in metric_data_queries if query_shard(query, shard_count) == shard]
+
+def split_wide_queries(metric_data_queries: List[dict], period: int) -> Tuple[List[dict], Dict[int, List[dict]]]:
+    """
+    Split queries into those whose Period fits a window of period seconds,
+    and those with a wider Period grouped by it.
+    """
+    narrow = []
+    wide = {}
+    for query in metric_data_queries:
+        if query_period(query) > period:
+            wide.setdefault(query_period(query), []).append(query)
+        else:
+            narrow.append(query)
+    return narrow, wide
+
+def chunk_queries(metric_data_queries: List[dict], max_queries: int = MAX_QUERIES_PER_REQUEST) -> List[List[dict]]:
+    """Split queries into consecutive chunks of at most max_queries."""
+    if max_queries <= 0:
+        raise ValueError("max_queries must be a positive integer")
+    return [
+        metric_data_queries[i:i + max_queries]
+        for i in range(0, len(metric_data_queries), max_queries)
+    ]
+
+class QueryPlan():
+    """
+    GetMetricData calls covering a set of MetricDataQueries
+
+    Period is a per-query field, so queries of every Period share a call
+    and each call covers the same time range.
+    """
+    calls: List[List[dict]]
+
+    def __init__(self, calls: List[List[dict]]) -> None:
+        self.calls = calls
+
+    def query_count(self) -> int:
+        """Return the number of queries across every call."""
+        return sum(len(call) for call in self.calls)
+
+    def datapoints(self, seconds: int) -> List[int]:
+        """
+        Return the datapoints each call requests over seconds.
+
+        An expression query counts as one series, the pages of a SEARCH that
+        expands past the limit are followed by NextToken.
+        """
+        return [
+            sum(max(1, seconds // query_period(query)) for query in call)
+            for call in self.calls
+        ]
+
+    def slice_seconds(self, align_period: int, max_datapoints: int = MAX_DATAPOINTS_PER_REQUEST) -> int:
+        """
+        Return the longest time slice, a multiple of align_period, that keeps
+        every call within max_datapoints.
+        """
+        # Datapoints per second of the busiest call
+        busiest = max(
+            sum(1 / query_period(query) for query in call)
+            for call in self.calls
+        )
+        windows = max(1, int(max_datapoints / busiest) // align_period)
+        return windows * align_period
+
+    def describe(self, seconds: int) -> dict:
+        """Summarize the calls, queries and datapoints requested over seconds."""
+        datapoints = self.datapoints(seconds)
+        return {
+            'Calls': len(self.calls),
+            'Queries': self.query_count(),
+            'ExpectedDatapoints': sum(datapoints),
+            'CallQueries': [len(call) for call in self.calls],
+            'CallDatapoints': datapoints
+        }
+
+def plan_queries(metric_data_queries: List[dict], max_queries: int = MAX_QUERIES_PER_REQUEST) -> QueryPlan:
+    """
+    Plan the fewest calls that hold every query.
+
+    Queries are dealt across the calls shortest Period first, so every call
+    requests a similar number of datapoints and long time ranges need the
+    fewest slices.
+    """
+    if max_queries <= 0:
+        raise ValueError("max_queries must be a positive integer")
+    call_count = -(-len(metric_data_queries) // max_queries)
+    calls = [[] for _ in range(call_count)]
+    ordered = sorted(metric_data_queries, key=query_period)
+    for index, query in enumerate(ordered):
+        calls[index % call_count].append(query)
+    return QueryPlan(calls)
+
+def slice_seconds(
+    query_plan: QueryPlan,
+    align_period: int,
+    max_datapoints: int = MAX_DATAPOINTS_PER_REQUEST
+) -> int:
+    """Return the longest aligned time slice the plan's calls can fetch at once."""
+    return query_plan.slice_seconds(align_period, max_datapoints)
+
+def time_slices(start_time: datetime, end_time: datetime, seconds: int) -> List[Tuple[datetime, datetime]]:
+    """Split [start_time, end_time) into consecutive slices of at most seconds."""
+    if seconds <= 0:
+        raise ValueError("seconds must be a positive integer")
+    step = timedelta(seconds=seconds)
+    slices = []
+    while start_time < end_time:
+        slices.append((start_time, min(start_time + step, end_time)))
+        start_time += step
+    return slices
@@ -0,0 +1,38 @@
+"""
+
+## Rate Limit
+Thread-safe token bucket shared by concurrent API callers, keeping a
+burst of requests under the account's transactions-per-second quota.
+
+"""
+import time
+import threading
+
+class RateLimiter():
+    """
+    Token bucket allowing rate calls per second with bursts up to burst
+    """
+    rate: float
+    burst: int
+
+    def __init__(self, rate: float, burst: int = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
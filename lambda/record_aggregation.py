@@ -0,0 +1,219 @@
+"""
+
+## Record Aggregation
+Pack many stream records into one Kinesis record using the Kinesis
+Producer Library aggregation format. Firehose de-aggregates these records
+when reading from a Kinesis stream, and consumers can use deaggregate_record
+or any KPL de-aggregation library.
+
+An aggregated record is the KPL magic prefix, a protobuf AggregatedRecord
+message and the MD5 digest of that message:
+
+    message AggregatedRecord {
+        repeated string partition_key_table = 1;
+        repeated string explicit_hash_key_table = 2;
+        repeated Record records = 3;
+    }
+    message Record {
+        required uint64 partition_key_index = 1;
+        optional uint64 explicit_hash_key_index = 2;
+        required bytes data = 3;
+    }
+
+Kinesis places an aggregated record by its outer partition key, so inner
+records are only packed together when they share a partition key, or,
+given the shard count of an evenly split stream, when their keys land on
+the same shard, as the KPL does.
+
+"""
+import json
+import time
+import hashlib
+from typing import List
+
+from .partitioning import shard_for_key
+
+KPL_MAGIC = b'\xf3\x89\x9a\xc2'
+DIGEST_SIZE = 16
+
+# KPL default AggregationMaxSize
+MAX_AGGREGATED_BYTES = 51200
+
+VARINT = 0
+LENGTH_DELIMITED = 2
+
+def encode_varint(value: int) -> bytes:
+    """Encode a non-negative integer as a protobuf varint."""
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+def decode_varint(data: bytes, position: int):
+    """Decode the varint at position, returning it and the next position."""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+def encode_field(field: int, payload: bytes) -> bytes:
+    """Encode a length-delimited protobuf field."""
+    return encode_varint(field << 3 | LENGTH_DELIMITED) + encode_varint(len(payload)) + payload
+
+def decode_fields(data: bytes):
+    """Yield (field, value) pairs of a protobuf message."""
+    position = 0
+    while position < len(data):
+        key, position = decode_varint(data, position)
+        field, wire_type = key >> 3, key & 0x7
+        if wire_type == VARINT:
+            value, position = decode_varint(data, position)
+        elif wire_type == LENGTH_DELIMITED:
+            length, position = decode_varint(data, position)
+            value = data[position:position + length]
+            position += length
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield field, value
+
+def encode_record(partition_key_index: int, data: bytes) -> bytes:
+    """Encode the Record message of one inner record."""
+    return (
+        encode_varint(1 << 3 | VARINT) + encode_varint(partition_key_index)
+        + encode_field(3, data)
+    )
+
+def record_data(record: dict) -> bytes:
+    """Return the Data of a stream record as bytes."""
+    data = record['Data']
+    return data.encode('utf-8') if isinstance(data, str) else data
+
+def aggregate_records(records: List[dict], max_bytes: int = MAX_AGGREGATED_BYTES, shard_count: int = None) -> List[dict]:
+    """
+    Pack records into aggregated records of at most max_bytes, keeping
+    every record on the shard its own partition key maps to.
+
+    Records are grouped per partition key, or per shard when shard_count is
+    given, and packed in order within each group. Each aggregated record
+    takes the partition key of its first inner record.
+    """
+    groups = {}
+    for record in records:
+        key = record['PartitionKey']
+        groups.setdefault(shard_for_key(key, shard_count) if shard_count else key, []).append(record)
+    aggregated = []
+    for group in groups.values():
+        aggregated += pack_records(group, max_bytes)
+    return aggregated
+
+def pack_records(records: List[dict], max_bytes: int = MAX_AGGREGATED_BYTES) -> List[dict]:
+    """Pack records, in order, into aggregated records of at most max_bytes."""
+    aggregated = []
+    keys = {}
+    messages = []
+    size = len(KPL_MAGIC) + DIGEST_SIZE
+
+    def flush():
+        message = b''.join(
+            [encode_field(1, key.encode('utf-8')) for key in keys] + messages
+        )
+        aggregated.append({
+            'Data': KPL_MAGIC + message + hashlib.md5(message).digest(),
+            'PartitionKey': next(iter(keys))
+        })
+
+    for record in records:
+        key = record['PartitionKey']
+        key_entry = b'' if key in keys else encode_field(1, key.encode('utf-8'))
+        message = encode_field(3, encode_record(keys.get(key, len(keys)), record_data(record)))
+        if messages and size + len(key_entry) + len(message) > max_bytes:
+            flush()
+            keys = {}
+            messages = []
+            size = len(KPL_MAGIC) + DIGEST_SIZE
+            key_entry = encode_field(1, key.encode('utf-8'))
+            message = encode_field(3, encode_record(0, record_data(record)))
+        keys.setdefault(key, len(keys))
+        messages.append(message)
+        size += len(key_entry) + len(message)
+    if messages:
+        flush()
+    return aggregated
+
+def deaggregate_record(data: bytes, partition_key: str = None) -> List[dict]:
+    """
+    Return the inner records of an aggregated record.
+
+    Records without the KPL magic prefix are returned as a single record.
+    """
+    if not data.startswith(KPL_MAGIC):
+        return [{'Data': data, 'PartitionKey': partition_key}]
+
+    message = data[len(KPL_MAGIC):-DIGEST_SIZE]
+    if hashlib.md5(message).digest() != data[-DIGEST_SIZE:]:
+        raise ValueError("Aggregated record digest does not match its contents")
+
+    keys = []
+    records = []
+    for field, value in decode_fields(message):
+        if field == 1:
+            keys.append(value.decode('utf-8'))
+        elif field == 3:
+            inner = dict(decode_fields(value))
+            records.append((inner.get(1, 0), inner[3]))
+    return [{'Data': inner_data, 'PartitionKey': keys[index]} for index, inner_data in records]
+
+def compact_json(metric_object: dict) -> str:
+    """Serialize a metric record without whitespace, nulls or API status fields."""
+    return json.dumps(
+        {
+            key: value for key, value in metric_object.items()
+            if value is not None and key not in ('StatusCode', 'Messages')
+        },
+        default=str,
+        separators=(',', ':')
+    )
+
+def benchmark(metric_objects: List[dict], partition_keys: List[str], iterations: int = 10, shard_count: int = None) -> dict:
+    """
+    Compare the JSON and aggregated encodings of the same metric records,
+    reporting bytes per metric, Kinesis records and metrics encoded per second.
+    """
+    def json_encoding():
+        return [
+            {'Data': json.dumps(metric_object, default=str), 'PartitionKey': key}
+            for metric_object, key in zip(metric_objects, partition_keys)
+        ]
+
+    def aggregated_encoding():
+        return aggregate_records([
+            {'Data': compact_json(metric_object), 'PartitionKey': key}
+            for metric_object, key in zip(metric_objects, partition_keys)
+        ], shard_count=shard_count)
+
+    results = {}
+    for name, encode in (('json', json_encoding), ('aggregated', aggregated_encoding)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            records = encode()
+        elapsed = time.perf_counter() - start
+        total_bytes = sum(
+            len(record_data(record)) + len(record['PartitionKey'].encode('utf-8'))
+            for record in records
+        )
+        results[name] = {
+            'KinesisRecords': len(records),
+            'BytesPerMetric': round(total_bytes / max(1, len(metric_objects)), 1),
+            'MetricsPerSecond': round(len(metric_objects) * iterations / elapsed) if elapsed else None
+        }
+    return results
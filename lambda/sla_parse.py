@@ -2,16 +2,32 @@
 ## Parse SLAsets
 Lambda function that will parse the SLA objects and
 establish the mapping between the Invoked CW Alarm and Alarm obtained from SLAset.
+
+With NOTIFICATION_QUEUE set, payloads are queued and coalesced into one
+digest per reference_id before reaching the central topic, see
+alarm_coalescing.
 """
 import os
 import json
 import boto3
+from botocore.config import Config
 
 from definitions.definition import Definition
+from .alarm_coalescing import (
+    coalesce,
+    notification_queue,
+    parse_queue_message
+)
+from .sns_writer import SnsBatchPublisher
+from .log import get_logger
+
+# PublishBatch calls in flight at once, and the client's connection pool
+SNS_PUBLISH_WORKERS = int(os.environ.get('SNS_PUBLISH_WORKERS', '4'))
 
-SNS_CLIENT = boto3.client('sns')
+SNS_CLIENT = boto3.client('sns', config=Config(max_pool_connections=SNS_PUBLISH_WORKERS))
 CENTRAL_SNS_TOPIC = os.environ['CENTRAL_SNS_TOPIC']
 CENTRAL_ACCOUNT_NUMBER = os.environ['CENTRAL_ACCOUNT_NUMBER']
+LOGGER = get_logger(__name__)
 
 def main(
     event: dict,
@@ -19,77 +35,142 @@ def main(
 ) -> None:
     """Lambda Handler."""
 
-    alarm_name = json.loads(event['Records'][0]['Sns']['Message'])['AlarmName']
-    invoked_state = (event['Records'][0]['Sns']['Subject']).split(':')[0]
-    print("CloudWatch Alarm Name from the SNS topic payload is :{}".format(alarm_name))
+    account_number = context.invoked_function_arn.split(":")[4]
+    definition = Definition.cached(account=account_number)
+
+    notifications = []
+    for record in event['Records']:
+        payload, region, state, changed_at = parse_record(record, definition, account_number)
+        if payload is not None:
+            notifications.append((topic_arn(region), state, changed_at, payload))
+    LOGGER.info(
+        "Parsed alarm notifications",
+        record_count=len(event['Records']),
+        published_count=len(notifications)
+    )
+    LOGGER.sample("Received alarm", [record['Sns']['Subject'] for record in event['Records']])
+    LOGGER.sample("Matched SLA", [payload['unique_id'] for _topic, _state, _changed_at, payload in notifications])
 
-    derived_list = []
-    derived_list.append(alarm_name[0:alarm_name.find('-SLA')].split('-')[3])
-    derived_list.append(alarm_name[0:alarm_name.find('-SLA')].split('-')[4])
-    derived_list.append("-".join((alarm_name[0:alarm_name.find('-SLA')].split('-')[6:])))
-    print("The derived list used for future validation is : {}".format(derived_list))
+    queue = notification_queue()
+    if queue is None:
+        topic_messages = {}
+        for topic, _state, _changed_at, payload in notifications:
+            topic_messages.setdefault(topic, []).append(json.dumps(payload))
+        if topic_messages:
+            write_to_sns(topic_messages)
+        return
 
-    account_number = context.invoked_function_arn.split(":")[4]
-    region = event['Records'][0]['EventSubscriptionArn'].split(':')[3]
-    definition = Definition(account=account_number)
-
-    for sla_set in definition.sla_sets:
-        for sla in sla_set.slas:
-
-            metric_name = sla.metric.name
-            frequency = sla.metric.frequency
-            for dimension in sla.metric.dimensions:
-                if str(dimension.name).endswith('Bucket'):
-                    continue
-                dimension_value = dimension.value
-
-            if all(x in derived_list for x in [metric_name.lower(), frequency, dimension_value.lower()]):
-                print("metric_name: {}, frequency: {} and dimension_value: {} exist in the dervied_list".format(
-                    metric_name.lower(),
-                    frequency,
-                    dimension_value)
-                )
-
-                try:
-                    details = sla.details
-                    short_description = sla.short_description
-                    impact = sla.severity
-                except AttributeError as ex:
-                    print("Failed to grab the required attributes from the Metric definitions with error: {}".format(ex))
-
-                reference_id = "Unknown"
-                for metadata in sla.metric.metadata:
-                    if metadata.name.lower() == "function" or metadata.name.lower() == "dataset":
-                        reference_id = metadata.value
-
-                # Add fields as needed to the payload which will be published to the central sns topic
-                payload = {
-                    "details" : details,
-                    "short_description": short_description + ' caused by CloudWatch Alarm in ' + invoked_state + ' state',
-                    "impact" : impact,
-                    "unique_id": dimension_value+'-'+metric_name+'-'+frequency,
-                    "alarm_origin": "Data Governance",
-                    "reference_id": reference_id
-                }
-
-                if sla.sns_enabled:
-                    #Send the payload from the SLA object
-                    print("sending the payload to the central SNS topic")
-                    write_to_sns(payload, region)
-                else:
-                    print(
-                        "Could not find tt_create attribute in the metric definition, hence logging the value of details: {}, short_description: {}".format(
-                            details,
-                            short_description
-                        )
-                    )
-            else:
-                raise ValueError("Could not find the metric_name and dimension_value in dervied_list")
-
-def write_to_sns(payload, region):
-    """ Publish to SNS Topic. """
-    SNS_CLIENT.publish(
-        TopicArn=f'arn:aws:sns:{region}:{CENTRAL_ACCOUNT_NUMBER}:{CENTRAL_SNS_TOPIC}',
-        Message=json.dumps(payload)
+    if notifications:
+        queue.send(notifications)
+        LOGGER.info("Queued notifications for coalescing", notification_count=len(notifications))
+    if queue.drained_inline:
+        publish_coalesced(queue.drain())
+
+def coalesce_main(
+    event: dict,
+    context: dict
+) -> None:
+    """Lambda Handler for a window of queued notifications."""
+
+    publish_coalesced([parse_queue_message(record['body']) for record in event['Records']])
+
+def publish_coalesced(notifications: list) -> None:
+    """ Publish one digest per reference_id for a window of notifications. """
+    if not notifications:
+        return
+    topic_messages = coalesce(notifications)
+    LOGGER.info(
+        "Coalesced notifications",
+        notification_count=len(notifications),
+        digest_count=sum(len(messages) for messages in topic_messages.values())
+    )
+    write_to_sns(topic_messages)
+
+def parse_record(record: dict, definition: Definition, account_number: str):
+    """
+    Return the central payload, region, alarm state and state change time
+    for one SNS alarm notification, payload None when not published.
+    """
+    message = json.loads(record['Sns']['Message'])
+    alarm_name = message['AlarmName']
+    changed_at = message.get('StateChangeTime') or record['Sns']['Timestamp']
+    invoked_state = (record['Sns']['Subject']).split(':')[0]
+    region = record['EventSubscriptionArn'].split(':')[3]
+
+    # Keyed by the exact name the SLA alarm construct gives each alarm
+    sla_index = definition.sla_index(region)
+    sla = sla_index.get(alarm_name)
+    if sla is None:
+        LOGGER.error(
+            "No SLA defined for alarm, not publishing",
+            alarm_name=alarm_name,
+            account=account_number,
+            region=region,
+            sla_count=len(sla_index)
+        )
+        return None, region, invoked_state, changed_at
+
+    payload = sla_payload(sla, invoked_state)
+    if not sla.sns_enabled:
+        LOGGER.debug(
+            "SNS disabled for SLA, not publishing",
+            details=sla.details,
+            short_description=sla.short_description
+        )
+        return None, region, invoked_state, changed_at
+    LOGGER.dump("Central SNS payload", payload)
+    return payload, region, invoked_state, changed_at
+
+def sla_payload(sla, invoked_state: str) -> dict:
+    """Build the central SNS payload for an SLA whose alarm entered invoked_state."""
+    metric_name = sla.metric.name
+    frequency = sla.metric.frequency
+    dimension_value = ''
+    for dimension in sla.metric.dimensions or []:
+        if str(dimension.name).endswith('Bucket'):
+            continue
+        dimension_value = dimension.value
+
+    reference_id = "Unknown"
+    for metadata in sla.metric.metadata or []:
+        if metadata.name.lower() == "function" or metadata.name.lower() == "dataset":
+            reference_id = metadata.value
+
+    # Add fields as needed to the payload which will be published to the central sns topic
+    return {
+        "details" : sla.details,
+        "short_description": sla.short_description + ' caused by CloudWatch Alarm in ' + invoked_state + ' state',
+        "impact" : sla.severity,
+        "unique_id": dimension_value+'-'+metric_name+'-'+frequency,
+        "alarm_origin": "Data Governance",
+        "reference_id": reference_id
+    }
+
+def topic_arn(region: str) -> str:
+    """ Central SNS topic in region. """
+    return f'arn:aws:sns:{region}:{CENTRAL_ACCOUNT_NUMBER}:{CENTRAL_SNS_TOPIC}'
+
+def write_to_sns(topic_messages: dict) -> dict:
+    """ Publish messages to their central SNS topics in batches. """
+    stats = SnsBatchPublisher(
+        client=SNS_CLIENT,
+        max_workers=SNS_PUBLISH_WORKERS
+    ).publish(topic_messages)
+    LOGGER.info(
+        "Published to the central SNS topic",
+        topic=CENTRAL_SNS_TOPIC,
+        message_count=stats['MessageCount'],
+        batch_count=len(stats['Batches']),
+        throttled_count=stats['ThrottledCount']
     )
-    print("Published the payload to the central SNS topic successfully")
+    if stats['RejectedMessageCount']:
+        # A sender fault fails the same way on every replay, drop rather than retry the event
+        LOGGER.error(
+            "Central SNS rejected messages, dropping them",
+            topic=CENTRAL_SNS_TOPIC,
+            rejected_count=stats['RejectedMessageCount']
+        )
+        for messages in stats['RejectedMessages'].values():
+            LOGGER.sample("Rejected message", messages, rate=1.0)
+    LOGGER.dump("Central SNS batches", stats['Batches'])
+    return stats
@@ -4,21 +4,52 @@
 Lambda function that will query all metrics for a given namespace
 and send metric data for the last 60 seconds to a kinesis stream
 
+With SLA_STREAM_MODE=cdc only new, changed and deleted alarms are sent,
+tagged with their ChangeType, plus every alarm each
+SLA_SNAPSHOT_INTERVAL_MINUTES. With SLA_STREAM_MODE=history every state
+transition is read from the alarm history instead, at its exact time.
+
 """
 import os
 import json
-from typing import List
+from typing import (
+    Dict,
+    List
+)
 from datetime import timedelta, datetime, timezone
 
 import boto3
 
 from definitions.definition import Definition
 from dataquality.stream import MetricStream
+from dataquality.sla import alarm_name
+from .kinesis_writer import KinesisBatchWriter
+from .partitioning import partition_key
+from .alarm_history import (
+    WATERMARK_KEY,
+    get_alarm_history,
+    history_range,
+    transition
+)
+from .alarm_snapshot import (
+    DELETED,
+    SNAPSHOT,
+    diff_alarms,
+    snapshot_store
+)
+from .windowing import checkpoint_store
+from .log import get_logger
 
 CW_CLIENT = boto3.client('cloudwatch')
 KINESIS_CLIENT = boto3.client('kinesis')
+LOGGER = get_logger(__name__)
 KINESIS_STREAM_NAME = os.environ['KINESIS_STREAM_NAME']
 ALARM_NAME_PREFIX = os.environ['ALARM_NAME_PREFIX']
+# 'snapshot' sends every alarm each run, 'cdc' only the alarms that changed,
+# 'history' every state transition from the alarm history
+SLA_STREAM_MODE = os.environ.get('SLA_STREAM_MODE', 'snapshot')
+# In cdc and history modes, also send every alarm on minutes divisible by this, 0 disables
+SLA_SNAPSHOT_INTERVAL_MINUTES = int(os.environ.get('SLA_SNAPSHOT_INTERVAL_MINUTES', '0'))
 
 def main(
     event: dict,
@@ -27,24 +58,58 @@ def main(
     """Lambda Handler."""
 
     account_number = context.invoked_function_arn.split(":")[4]
-    definition = Definition(account=account_number)
-    dataset_stream = MetricStream(metric_sets=definition.metric_sets)
+    definition = Definition.cached(account=account_number)
+    dataset_stream = definition.metric_stream
     metric_sets=dataset_stream.metrics
+    alarm_index = definition.alarm_index(context.invoked_function_arn.split(":")[3])
 
     time = datetime.now()
+    if SLA_STREAM_MODE == 'history':
+        put_sla_transitions(
+            time=time,
+            context=context,
+            alarm_index=alarm_index
+        )
+        if not snapshot_due(time):
+            return
+
     sla_data = get_sla_data(
         alarmNamePrefix=ALARM_NAME_PREFIX
     )
 
-    for sla_object in sla_data:
-        print(sla_object)
+    LOGGER.info("Described alarms", alarm_count=len(sla_data))
+    LOGGER.sample("Alarm", sla_data)
+
+    if SLA_STREAM_MODE == 'history':
+        put_slas(
+            slas_data=sla_data,
+            time=time,
+            event=event,
+            context=context,
+            metric_sets=metric_sets,
+            alarm_index=alarm_index,
+            change_types={}
+        )
+        return
+
+    if SLA_STREAM_MODE == 'cdc':
+        put_sla_changes(
+            slas_data=sla_data,
+            time=time,
+            event=event,
+            context=context,
+            metric_sets=metric_sets,
+            alarm_index=alarm_index
+        )
+        return
 
     put_slas(
         slas_data=sla_data,
         time=time,
         event=event,
         context=context,
-        metric_sets=metric_sets
+        metric_sets=metric_sets,
+        alarm_index=alarm_index
     )
 
 def get_sla_data(alarmNamePrefix):
@@ -58,44 +123,226 @@ def get_sla_data(alarmNamePrefix):
         sla_data_results += page['MetricAlarms']
     return sla_data_results
 
-def translate_clas_to_records(slas_data: List[dict], time: datetime, event: dict, context: dict, metric_sets):
-    """Translate CW sla list to Kinesis stream records."""
+def snapshot_due(time: datetime, interval_minutes: int = SLA_SNAPSHOT_INTERVAL_MINUTES) -> bool:
+    """Whether a cdc run at time should send every alarm."""
+    if not interval_minutes:
+        return False
+    return int(time.replace(tzinfo=timezone.utc).timestamp() // 60) % interval_minutes == 0
+
+def translate_clas_to_records(
+    slas_data: List[dict],
+    time: datetime,
+    event: dict,
+    context: dict,
+    metric_sets,
+    alarm_index: dict = None,
+    change_types: Dict[str, str] = None,
+    deleted: List[str] = None
+):
+    """
+    Translate CW sla list to Kinesis stream records.
+
+    With change_types, each record carries its alarm's ChangeType, SNAPSHOT
+    when unchanged, and a DELETED record is added for every deleted alarm.
+    """
     records = []
-    metadata_map = {}
+    collection_time = time.replace(tzinfo=timezone.utc).isoformat()
+    account_id = context.invoked_function_arn.split(":")[4]
+    region = context.invoked_function_arn.split(":")[3]
+    unmatched = []
+    if alarm_index is None:
+        alarm_index = {alarm_name(metric, region): metric for metric in metric_sets}
 
     for sla_object in slas_data:
-        for metric in metric_sets:
-            resolved_alarm_id_from_cloudwatch = ("-".join(sla_object['AlarmName'].split('-')[3:-5]))
-            resolved_alarm_id_from_metric_object = str(metric.alarm_unique_id())[:-1]
-            if resolved_alarm_id_from_metric_object == resolved_alarm_id_from_cloudwatch:
-                sla_object['AccountId'] = context.invoked_function_arn.split(":")[4]
-                sla_object['Region'] = context.invoked_function_arn.split(":")[3]
-                sla_object['MetricNamespace'] = sla_object['Namespace']
-                sla_object['MetricPeriod'] = sla_object['Period']
-                sla_object['MetricStatistic'] = sla_object['Statistic']
-                sla_object['CollectionTime'] = time.replace(tzinfo=timezone.utc).isoformat()
-                if metric.metadata:
-                    for meta in metric.metadata:
-                        metadata_map[meta.name] = meta.value
-                    sla_object['Metadata'] = metadata_map
-            else:
-                continue
+        metric = alarm_index.get(sla_object['AlarmName'])
+        if metric is not None:
+            sla_object['AccountId'] = account_id
+            sla_object['Region'] = region
+            sla_object['MetricNamespace'] = sla_object['Namespace']
+            sla_object['MetricPeriod'] = sla_object['Period']
+            sla_object['MetricStatistic'] = sla_object['Statistic']
+            sla_object['CollectionTime'] = collection_time
+            if metric.metadata:
+                sla_object['Metadata'] = {meta.name: meta.value for meta in metric.metadata}
+        else:
+            unmatched.append(sla_object['AlarmName'])
+        if change_types is not None:
+            sla_object['ChangeType'] = change_types.get(sla_object['AlarmName'], SNAPSHOT)
         records.append({
             'Data': json.dumps(sla_object, default=str),
-            'PartitionKey': 'default'
+            'PartitionKey': partition_key(
+                series_id=sla_object['AlarmName'],
+                namespace=sla_object.get('Namespace'),
+                account=account_id
+            )
         })
-    print(records)
+    for deleted_name in deleted or []:
+        records.append({
+            'Data': json.dumps({
+                'AlarmName': deleted_name,
+                'ChangeType': DELETED,
+                'AccountId': account_id,
+                'Region': region,
+                'CollectionTime': collection_time
+            }),
+            'PartitionKey': partition_key(series_id=deleted_name, account=account_id)
+        })
+    if unmatched:
+        LOGGER.warning(
+            "Alarms without a matching metric",
+            unmatched_count=len(unmatched),
+            alarm_count=len(slas_data)
+        )
+        LOGGER.sample("Unmatched alarm", unmatched)
+    LOGGER.dump("SLA records", records)
     return records
 
-def put_slas(slas_data: List[dict], time: datetime, event: dict, context: dict, metric_sets):
+def put_slas(
+    slas_data: List[dict],
+    time: datetime,
+    event: dict,
+    context: dict,
+    metric_sets,
+    alarm_index: dict = None,
+    change_types: Dict[str, str] = None,
+    deleted: List[str] = None
+):
     """Put records to kinesis stream"""
-    KINESIS_CLIENT.put_records(
-        Records=translate_clas_to_records(
+    writer = KinesisBatchWriter(
+        client=KINESIS_CLIENT,
+        stream_name=KINESIS_STREAM_NAME
+    )
+    stats = writer.put_records(
+        translate_clas_to_records(
             slas_data=slas_data,
             time=time,
             event=event,
             context=context,
-            metric_sets=metric_sets
-        ),
-        StreamName=KINESIS_STREAM_NAME
+            metric_sets=metric_sets,
+            alarm_index=alarm_index,
+            change_types=change_types,
+            deleted=deleted
+        )
     )
+    LOGGER.info(
+        "Put SLA records",
+        record_count=stats['RecordCount'],
+        batch_count=len(stats['Batches']),
+        throttled_count=stats['ThrottledCount']
+    )
+    LOGGER.dump("SLA record batches", stats['Batches'])
+    return stats
+
+def put_sla_changes(slas_data: List[dict], time: datetime, event: dict, context: dict, metric_sets, alarm_index: dict = None):
+    """
+    Put only the alarms whose fingerprint changed since the stored snapshot,
+    or every alarm when a full snapshot is due, then advance the snapshot.
+    """
+    store = snapshot_store()
+    current, change_types, deleted = diff_alarms(slas_data, store.load())
+    full_snapshot = snapshot_due(time)
+    if not full_snapshot:
+        slas_data = [alarm for alarm in slas_data if alarm['AlarmName'] in change_types]
+    LOGGER.info(
+        "Diffed alarms against snapshot",
+        changed_count=len(change_types),
+        deleted_count=len(deleted),
+        full_snapshot=full_snapshot
+    )
+
+    stats = None
+    if slas_data or deleted:
+        stats = put_slas(
+            slas_data=slas_data,
+            time=time,
+            event=event,
+            context=context,
+            metric_sets=metric_sets,
+            alarm_index=alarm_index,
+            change_types=change_types,
+            deleted=deleted
+        )
+    # Only after the put, so a failed run resends its changes
+    store.update({name: current[name] for name in change_types}, deleted)
+    return stats
+
+def translate_transitions_to_records(transitions: List[dict], time: datetime, context: dict, alarm_index: dict):
+    """Translate alarm history transitions to Kinesis stream records."""
+    records = []
+    collection_time = time.replace(tzinfo=timezone.utc).isoformat()
+    account_id = context.invoked_function_arn.split(":")[4]
+    region = context.invoked_function_arn.split(":")[3]
+    unmatched = 0
+
+    for sla_object in transitions:
+        sla_object['AccountId'] = account_id
+        sla_object['Region'] = region
+        sla_object['CollectionTime'] = collection_time
+        metric = alarm_index.get(sla_object['AlarmName'])
+        if metric is not None:
+            sla_object['MetricNamespace'] = metric.namespace
+            sla_object['MetricName'] = metric.name
+            sla_object['MetricPeriod'] = metric.period
+            sla_object['MetricStatistic'] = metric.statistic
+            if metric.metadata:
+                sla_object['Metadata'] = {meta.name: meta.value for meta in metric.metadata}
+        else:
+            unmatched += 1
+        records.append({
+            'Data': json.dumps(sla_object, default=str),
+            'PartitionKey': partition_key(
+                series_id=sla_object['AlarmName'],
+                namespace=sla_object.get('MetricNamespace'),
+                account=account_id
+            )
+        })
+    if unmatched:
+        LOGGER.warning(
+            "Transitions without a matching metric",
+            unmatched_count=unmatched,
+            transition_count=len(transitions)
+        )
+    LOGGER.dump("SLA transition records", records)
+    return records
+
+def put_sla_transitions(time: datetime, context: dict, alarm_index: dict):
+    """Put the alarm state transitions written since the watermark, then advance it."""
+    store = checkpoint_store()
+    start, end = history_range(
+        now=time.replace(tzinfo=timezone.utc),
+        watermark=store.get_watermark(WATERMARK_KEY)
+    )
+    transitions = [
+        transition(item)
+        for item in get_alarm_history(CW_CLIENT, start, end, ALARM_NAME_PREFIX)
+    ]
+    LOGGER.info(
+        "Read alarm history",
+        start=start.isoformat(),
+        end=end.isoformat(),
+        transition_count=len(transitions)
+    )
+
+    stats = None
+    if transitions:
+        writer = KinesisBatchWriter(
+            client=KINESIS_CLIENT,
+            stream_name=KINESIS_STREAM_NAME
+        )
+        stats = writer.put_records(
+            translate_transitions_to_records(
+                transitions=transitions,
+                time=time,
+                context=context,
+                alarm_index=alarm_index
+            )
+        )
+        LOGGER.info(
+            "Put SLA transition records",
+            record_count=stats['RecordCount'],
+            batch_count=len(stats['Batches']),
+            throttled_count=stats['ThrottledCount']
+        )
+    # Only after the put, so a failed run rereads its range
+    store.set_watermark(WATERMARK_KEY, end)
+    return stats
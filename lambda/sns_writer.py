@@ -0,0 +1,163 @@
+"""
+
+## SNS Writer
+Batched PublishBatch publisher for the central SNS topics. Messages are
+grouped per topic, packed by count and byte size, only failed entries
+are resubmitted and batches are published on a bounded thread pool.
+Entries SNS rejects as a sender fault are dropped and returned in the
+stats, only entries still failing retryably raise.
+
+"""
+import time
+from typing import (
+    Dict,
+    List
+)
+from concurrent.futures import ThreadPoolExecutor
+
+from .batching import pack_batches, send_with_retries
+
+# PublishBatch service limits
+MAX_MESSAGES_PER_REQUEST = 10
+MAX_BYTES_PER_REQUEST = 256 * 1024
+
+THROTTLING_ERROR_CODES = (
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'InternalError',
+    'ServiceUnavailable'
+)
+
+class SnsPublishError(Exception):
+    """Raised when retryable messages are still failing after every retry."""
+
+    def __init__(self, failed_messages: Dict[str, List[str]], stats: dict) -> None:
+        count = sum(len(messages) for messages in failed_messages.values())
+        super().__init__(f"{count} messages failed to publish after retries")
+        self.failed_messages = failed_messages
+        self.stats = stats
+
+def message_size(message: str) -> int:
+    """Return the bytes a message counts against the PublishBatch limits."""
+    return len(message.encode('utf-8'))
+
+def pack_messages(
+    messages: List[str],
+    max_messages: int = MAX_MESSAGES_PER_REQUEST,
+    max_bytes: int = MAX_BYTES_PER_REQUEST
+) -> List[List[str]]:
+    """Pack messages, in order, into batches within the count and byte limits."""
+    return pack_batches(messages, message_size, max_messages, max_bytes, max_bytes, '256 KiB SNS message')
+
+class SnsBatchPublisher():
+    """
+    Publish messages to SNS topics in size-aware PublishBatch calls
+    """
+    max_attempts: int
+    max_workers: int
+
+    def __init__(
+        self,
+        client,
+        max_messages: int = MAX_MESSAGES_PER_REQUEST,
+        max_bytes: int = MAX_BYTES_PER_REQUEST,
+        max_attempts: int = 5,
+        base_delay: float = 0.1,
+        max_delay: float = 5.0,
+        max_workers: int = 4
+    ) -> None:
+        self.client = client
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_workers = max_workers
+
+    def publish(self, topic_messages: Dict[str, List[str]]) -> dict:
+        """
+        Publish every message to its topic, raising SnsPublishError if any are
+        left failing retryably. Rejected messages are returned in the stats
+        under RejectedMessages, republishing them would fail the same way.
+        """
+        batches = [
+            (topic_arn, batch)
+            for topic_arn, messages in topic_messages.items()
+            for batch in pack_messages(messages, self.max_messages, self.max_bytes)
+        ]
+        stats = {
+            'MessageCount': sum(len(messages) for messages in topic_messages.values()),
+            'FailedMessageCount': 0,
+            'RejectedMessageCount': 0,
+            'RejectedMessages': {},
+            'ThrottledCount': 0,
+            'Batches': []
+        }
+        if not batches:
+            return stats
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(batches)))) as executor:
+            results = list(executor.map(lambda batch: self.publish_batch(*batch), batches))
+
+        failed_messages = {}
+        for (topic_arn, _batch), (batch_stats, batch_rejected, batch_failed) in zip(batches, results):
+            stats['Batches'].append(batch_stats)
+            stats['ThrottledCount'] += batch_stats['Throttled']
+            if batch_rejected:
+                stats['RejectedMessages'].setdefault(topic_arn, []).extend(batch_rejected)
+            if batch_failed:
+                failed_messages.setdefault(topic_arn, []).extend(batch_failed)
+        stats['FailedMessageCount'] = sum(len(messages) for messages in failed_messages.values())
+        stats['RejectedMessageCount'] = sum(len(messages) for messages in stats['RejectedMessages'].values())
+
+        if failed_messages:
+            raise SnsPublishError(failed_messages, stats)
+        return stats
+
+    def publish_batch(self, topic_arn: str, batch: List[str]):
+        """Publish one batch, resubmitting only the retryable failed entries."""
+        start = time.perf_counter()
+        batch_stats = {
+            'TopicArn': topic_arn,
+            'Messages': len(batch),
+            'Attempts': 0,
+            'Throttled': 0,
+            'LatencyMs': 0.0
+        }
+        rejected = []
+
+        def send(pending: Dict[int, str]) -> Dict[int, str]:
+            response = self.client.publish_batch(
+                TopicArn=topic_arn,
+                PublishBatchRequestEntries=[
+                    {'Id': str(entry_id), 'Message': message}
+                    for entry_id, message in pending.items()
+                ]
+            )
+            retry = {}
+            for failure in response.get('Failed', []):
+                entry_id = int(failure['Id'])
+                # A sender fault, such as a malformed message, fails the same way again
+                if failure.get('SenderFault'):
+                    rejected.append(pending[entry_id])
+                    continue
+                if failure.get('Code') in THROTTLING_ERROR_CODES:
+                    batch_stats['Throttled'] += 1
+                retry[entry_id] = pending[entry_id]
+            return retry
+
+        pending = send_with_retries(
+            send,
+            dict(enumerate(batch)),
+            batch_stats,
+            THROTTLING_ERROR_CODES,
+            self.max_attempts,
+            self.base_delay,
+            self.max_delay
+        )
+        failed = list(pending.values())
+        batch_stats['Rejected'] = len(rejected)
+        batch_stats['Failed'] = len(failed)
+        batch_stats['LatencyMs'] = round((time.perf_counter() - start) * 1000, 2)
+        return batch_stats, rejected, failed
@@ -0,0 +1,212 @@
+"""
+
+## Windowing
+Frequency-aligned collection windows for the metric stream producer. A
+watermark per frequency records the end of the last emitted window, so
+each invocation collects exactly the windows that have closed since.
+
+"""
+import os
+import abc
+import json
+import sqlite3
+import functools
+import threading
+from typing import (
+    List,
+    Optional,
+    Tuple
+)
+from datetime import datetime, timedelta, timezone
+import dateutil.parser
+
+import boto3
+from botocore.exceptions import ClientError
+
+# Oldest windows first, the rest are picked up by the next invocation
+MAX_CATCHUP_WINDOWS = int(os.environ.get('MAX_CATCHUP_WINDOWS', '60'))
+# Seconds a closed window is held back for late CloudWatch datapoints, the
+# hour and day schedules fire two minutes past their boundary to clear it
+WINDOW_LAG_SECONDS = int(os.environ.get('WINDOW_LAG_SECONDS', '60'))
+
+CHECKPOINT_STORE = os.environ.get('CHECKPOINT_STORE', 'sqlite')
+CHECKPOINT_PATH = os.environ.get('CHECKPOINT_PATH', '/tmp/metric_checkpoints.db')
+CHECKPOINT_TABLE_NAME = os.environ.get('CHECKPOINT_TABLE_NAME')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def to_utc(time: datetime) -> datetime:
+    """Return time as an aware UTC datetime, treating naive times as UTC."""
+    if time.tzinfo is None:
+        return time.replace(tzinfo=timezone.utc)
+    return time.astimezone(timezone.utc)
+
+def align(time: datetime, period: int) -> datetime:
+    """Round time down to a multiple of period seconds since the epoch."""
+    elapsed = int((to_utc(time) - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=elapsed - elapsed % period)
+
+def pending_windows(
+    now: datetime,
+    period: int,
+    watermark: Optional[datetime] = None,
+    max_windows: int = MAX_CATCHUP_WINDOWS,
+    lag: int = WINDOW_LAG_SECONDS
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Return the (start, end) windows after watermark that closed at least
+    lag seconds before now, oldest first.
+
+    Without a watermark only the most recently settled window is returned.
+    """
+    if max_windows <= 0:
+        raise ValueError("max_windows must be a positive integer")
+    end = align(to_utc(now) - timedelta(seconds=lag), period)
+    step = timedelta(seconds=period)
+    start = end - step if watermark is None else align(watermark, period)
+
+    windows = []
+    while start + step <= end and len(windows) < max_windows:
+        windows.append((start, start + step))
+        start += step
+    return windows
+
+class CheckpointStore(abc.ABC):
+    """
+    Persist the collection watermark of each frequency
+    """
+
+    @abc.abstractmethod
+    def get_watermark(self, frequency: str) -> Optional[datetime]:
+        """Return the end of the last emitted window, or None."""
+
+    @abc.abstractmethod
+    def set_watermark(self, frequency: str, watermark: datetime) -> bool:
+        """
+        Record watermark as the end of the last emitted window. Watermarks
+        only move forward, returns False when the stored one is already at
+        or past watermark.
+        """
+
+class FileCheckpointStore(CheckpointStore):
+    """
+    Watermarks in a local JSON file
+    """
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except FileNotFoundError:
+            return {}
+
+    def get_watermark(self, frequency: str) -> Optional[datetime]:
+        value = self._read().get(frequency)
+        return dateutil.parser.parse(value) if value else None
+
+    def set_watermark(self, frequency: str, watermark: datetime) -> bool:
+        with self._lock:
+            checkpoints = self._read()
+            current = checkpoints.get(frequency)
+            if current and dateutil.parser.parse(current) >= to_utc(watermark):
+                return False
+            checkpoints[frequency] = to_utc(watermark).isoformat()
+            # Replace atomically so a crash never leaves a truncated file
+            temp_path = f'{self.path}.tmp'
+            with open(temp_path, 'w') as checkpoint_file:
+                json.dump(checkpoints, checkpoint_file)
+            os.replace(temp_path, self.path)
+        return True
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """
+    Watermarks in a local SQLite database
+    """
+    path: str
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS watermarks '
+                '(frequency TEXT PRIMARY KEY, watermark TEXT NOT NULL)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path)
+
+    def get_watermark(self, frequency: str) -> Optional[datetime]:
+        with self._connect() as connection:
+            row = connection.execute(
+                'SELECT watermark FROM watermarks WHERE frequency = ?',
+                (frequency,)
+            ).fetchone()
+        return dateutil.parser.parse(row[0]) if row else None
+
+    def set_watermark(self, frequency: str, watermark: datetime) -> bool:
+        # UTC isoformat strings of one format order like the times they hold
+        value = to_utc(watermark).isoformat()
+        with self._connect() as connection:
+            if connection.execute(
+                'INSERT OR IGNORE INTO watermarks (frequency, watermark) VALUES (?, ?)',
+                (frequency, value)
+            ).rowcount:
+                return True
+            return connection.execute(
+                'UPDATE watermarks SET watermark = ? WHERE frequency = ? AND watermark < ?',
+                (value, frequency, value)
+            ).rowcount > 0
+
+class DynamoDBCheckpointStore(CheckpointStore):
+    """
+    Watermarks in a DynamoDB table keyed on frequency
+    """
+    table_name: str
+
+    def __init__(self, client, table_name: str) -> None:
+        self.client = client
+        self.table_name = table_name
+
+    def get_watermark(self, frequency: str) -> Optional[datetime]:
+        response = self.client.get_item(
+            TableName=self.table_name,
+            Key={'frequency': {'S': frequency}},
+            ConsistentRead=True
+        )
+        item = response.get('Item')
+        return dateutil.parser.parse(item['watermark']['S']) if item else None
+
+    def set_watermark(self, frequency: str, watermark: datetime) -> bool:
+        # UTC isoformat strings of one format order like the times they hold
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={
+                    'frequency': {'S': frequency},
+                    'watermark': {'S': to_utc(watermark).isoformat()}
+                },
+                ConditionExpression='attribute_not_exists(watermark) OR watermark < :watermark',
+                ExpressionAttributeValues={':watermark': {'S': to_utc(watermark).isoformat()}}
+            )
+        except ClientError as ex:
+            if ex.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise ex
+            return False
+        return True
+
+@functools.lru_cache(maxsize=None)
+def checkpoint_store(store: str = None) -> CheckpointStore:
+    """Return the checkpoint store selected by CHECKPOINT_STORE, reused across calls."""
+    store = store or CHECKPOINT_STORE
+    if store == 'dynamodb':
+        return DynamoDBCheckpointStore(boto3.client('dynamodb'), CHECKPOINT_TABLE_NAME)
+    if store == 'sqlite':
+        return SQLiteCheckpointStore(CHECKPOINT_PATH)
+    if store == 'file':
+        return FileCheckpointStore(CHECKPOINT_PATH)
+    raise ValueError(f"Unknown checkpoint store {store}, expected one of ('dynamodb', 'sqlite', 'file')")
@@ -31,8 +31,21 @@ from definitions.definition import Definition
 
 ACCOUNT_NUMBER = os.environ.get('CDK_DEPLOY_ACCOUNT')
 CENTRAL_ACCOUNT_NUMBER = fetch_account_central(ACCOUNT_NUMBER)
-
-definition = Definition(account=ACCOUNT_NUMBER)
+# Collect with one long-running invocation per quarter hour instead of per-frequency rules
+COLLECTOR_MODE = os.environ.get('COLLECTOR_MODE', 'false').lower() == 'true'
+# Above 1, each scheduled invocation fans out to this many worker invocations
+WORKER_SHARDS = int(os.environ.get('WORKER_SHARDS', '1'))
+# 'aggregated' packs metric records into KPL aggregated records per stream shard
+RECORD_ENCODING = os.environ.get('RECORD_ENCODING', 'json')
+# 'cdc' streams only changed alarms, 'history' every transition from the alarm history,
+# both with a full snapshot every interval minutes
+SLA_STREAM_MODE = os.environ.get('SLA_STREAM_MODE', 'snapshot')
+SLA_SNAPSHOT_INTERVAL_MINUTES = int(os.environ.get('SLA_SNAPSHOT_INTERVAL_MINUTES', '60'))
+# Above 0, SLA notifications are coalesced for this many seconds into one digest per reference_id
+COALESCE_WINDOW_SECONDS = int(os.environ.get('COALESCE_WINDOW_SECONDS', '0'))
+
+# Executes the definitions and ships them as a manifest in the Lambda asset
+definition = Definition.compile(account=ACCOUNT_NUMBER)
 
 current_dir = os.path.dirname(__file__)
 
@@ -99,13 +112,29 @@ class MetricStreamer(core.Stack):
         _lambda_resource = MetricStreamerConstruct(
             self,
             'metrics_publishing_lambda',
-            stream_dict
+            stream_dict,
+            collector=COLLECTOR_MODE,
+            worker_shards=WORKER_SHARDS,
+            record_encoding=RECORD_ENCODING
         )
 
+        if COLLECTOR_MODE:
+            aws_events.Rule(
+                self,
+                id='event_rule-collector',
+                schedule=aws_events.Schedule.expression('rate(15 minutes)'), # matches the 15 minute timeout
+                targets=[aws_events_targets.LambdaFunction(
+                    handler=_lambda_resource.function,
+                    event=aws_events.RuleTargetInput.from_object({'frequencies': self.metric_frequencies})
+                )]
+            )
+            return
+
         aws_events.Rule(
             self,
             id='event_rule-day',
-            schedule=aws_events.Schedule.expression('cron(0 0 * * ? *)'), # top of every day (midnight)
+            # Past midnight by more than WINDOW_LAG_SECONDS, so the day that just closed has settled
+            schedule=aws_events.Schedule.expression('cron(2 0 * * ? *)'),
             targets=[aws_events_targets.LambdaFunction(
                 handler=_lambda_resource.function,
                 event=aws_events.RuleTargetInput.from_object({'frequency': 'day'})
@@ -115,7 +144,8 @@ class MetricStreamer(core.Stack):
         aws_events.Rule(
             self,
             id='event_rule-hour',
-            schedule=aws_events.Schedule.expression('cron(0 * * * ? *)'), # top of every hour
+            # Past the hour by more than WINDOW_LAG_SECONDS, so the hour that just closed has settled
+            schedule=aws_events.Schedule.expression('cron(2 * * * ? *)'),
             targets=[aws_events_targets.LambdaFunction(
                 handler=_lambda_resource.function,
                 event=aws_events.RuleTargetInput.from_object({'frequency': 'hour'})
@@ -125,7 +155,8 @@ class MetricStreamer(core.Stack):
         aws_events.Rule(
             self,
             id='event_rule-minute',
-            schedule=aws_events.Schedule.expression('cron(0/1 * * * ? *)'), # top of every minute
+            # Every minute, each run emits the minute that closed WINDOW_LAG_SECONDS earlier
+            schedule=aws_events.Schedule.expression('cron(0/1 * * * ? *)'),
             targets=[aws_events_targets.LambdaFunction(
                 handler=_lambda_resource.function,
                 event=aws_events.RuleTargetInput.from_object({'frequency': 'minute'})
@@ -149,7 +180,9 @@ class MetricStreamer(core.Stack):
             self,
             'slas_publishing_lambda',
             stream_name=sla_kinesis_resources.kinesis_stream.stream_name,
-            stream_arn=sla_kinesis_resources.kinesis_stream.stream_arn
+            stream_arn=sla_kinesis_resources.kinesis_stream.stream_arn,
+            stream_mode=SLA_STREAM_MODE,
+            snapshot_interval_minutes=SLA_SNAPSHOT_INTERVAL_MINUTES
         )
 
         aws_events.Rule(
@@ -265,7 +298,8 @@ class MetricStreamer(core.Stack):
             self,
             'parse_sla_lambda',
             central_account_number=CENTRAL_ACCOUNT_NUMBER,
-            central_sns_topic=self.sns_topic_name
+            central_sns_topic=self.sns_topic_name,
+            coalesce_window_seconds=COALESCE_WINDOW_SECONDS
         )
 
         self.sns_topic.add_subscription(